@@ -0,0 +1,149 @@
+"""
+Cold storage for old chat messages.
+
+``archive_room`` moves a room's messages older than a cutoff, oldest first,
+into ``ArchivedSegment`` rows, one compressed segment per transaction. The
+archive is therefore always the oldest part of a room's history, and a run
+that stops halfway is resumed simply by running it again. A room's
+last_message always stays in the Message table.
+
+``ArchiveKeysetPagination`` pages through the archive and the Message table
+as one history; segments are found through their first/last key indexes and
+only the ones a page touches are decompressed.
+"""
+
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from techsafar.pagination import KeysetPagination
+from .models import ArchivedSegment, ChatRoom, Message
+
+CONFIG = {'AFTER_DAYS': 90, 'SEGMENT_SIZE': 500, **getattr(settings, 'CHAT_ARCHIVE', {})}
+
+MESSAGE_FIELDS = ('id', 'sender_id', 'content', 'created_at', 'is_read')
+
+
+def encode_segment(rows):
+    records = [[row[0], row[1], row[2], row[3].isoformat(), row[4]] for row in rows]
+    return zlib.compress(json.dumps(records, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_segment(segment):
+    """The segment's messages as unsaved ``Message`` instances, oldest first."""
+    records = json.loads(zlib.decompress(bytes(segment.data)))
+    return [
+        Message(id=pk, chat_room_id=segment.chat_room_id, sender_id=sender_id, content=content,
+                created_at=parse_datetime(created_at), is_read=is_read)
+        for pk, sender_id, content, created_at, is_read in records
+    ]
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=CONFIG['AFTER_DAYS'])
+
+
+def archive_room(room_id, cutoff, segment_size=None, max_segments=None):
+    """Archive the room's messages created before ``cutoff``; returns (segments, messages)."""
+    segment_size = segment_size or CONFIG['SEGMENT_SIZE']
+    last_message_id = ChatRoom.objects.filter(pk=room_id).values_list('last_message_id', flat=True).first()
+    segments = messages = 0
+    while max_segments is None or segments < max_segments:
+        with transaction.atomic():
+            rows = list(
+                Message.objects.filter(chat_room_id=room_id, created_at__lt=cutoff)
+                .exclude(pk=last_message_id).order_by('created_at', 'id')
+                .values_list(*MESSAGE_FIELDS)[:segment_size]
+            )
+            if not rows:
+                break
+            ArchivedSegment.objects.create(
+                chat_room_id=room_id,
+                first_id=rows[0][0], first_created_at=rows[0][3],
+                last_id=rows[-1][0], last_created_at=rows[-1][3],
+                message_count=len(rows), data=encode_segment(rows),
+            )
+            Message.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        segments += 1
+        messages += len(rows)
+        if len(rows) < segment_size:
+            break
+    return segments, messages
+
+
+def rooms_to_archive(cutoff):
+    return (Message.objects.filter(created_at__lt=cutoff).order_by()
+            .values_list('chat_room_id', flat=True).distinct())
+
+
+def read_archive(segments, order, values, limit):
+    """
+    Up to ``limit`` archived messages in ``order`` (the keyset ordering of
+    MessageListView) after the cursor ``values``, from the ``segments``
+    queryset of one room.
+    """
+    descending = order[0].startswith('-')
+    cursor = None
+    if values is not None:
+        created_at = parse_datetime(values[0]) if isinstance(values[0], str) else values[0]
+        cursor = (created_at, int(values[1]))
+        # Only segments that reach past the cursor
+        if descending:
+            segments = segments.filter(
+                Q(first_created_at__lt=cursor[0]) | Q(first_created_at=cursor[0], first_id__lt=cursor[1])
+            )
+        else:
+            segments = segments.filter(
+                Q(last_created_at__gt=cursor[0]) | Q(last_created_at=cursor[0], last_id__gt=cursor[1])
+            )
+    if descending:
+        segments = segments.order_by('-last_created_at', '-last_id')
+    else:
+        segments = segments.order_by('first_created_at', 'first_id')
+
+    found = []
+    for segment in segments.iterator(chunk_size=4):
+        messages = decode_segment(segment)
+        if descending:
+            messages.reverse()
+        for message in messages:
+            key = (message.created_at, message.pk)
+            if cursor is None or (key < cursor if descending else key > cursor):
+                found.append(message)
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+class ArchiveKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over Message rows plus the room's archived segments.
+    The view provides ``get_archive_segments()``, already restricted to
+    rooms the user may read.
+    """
+
+    def fetch(self, queryset, order, values, limit):
+        rows = super().fetch(queryset, order, values, limit)
+        if [key.lstrip('-') for key in order] != ['created_at', 'id']:
+            return rows
+        archived = read_archive(self.view.get_archive_segments(), order, values, limit)
+        if not archived:
+            return rows
+
+        senders = get_user_model().objects.in_bulk({message.sender_id for message in archived})
+        for message in archived:
+            message.sender = senders.get(message.sender_id)
+        merged = sorted(rows + archived, key=lambda message: (message.created_at, message.pk),
+                        reverse=order[0].startswith('-'))
+        return merged[:limit]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
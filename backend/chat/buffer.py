@@ -0,0 +1,195 @@
+import atexit
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages sent over WebSockets.
+
+    Consumers hand unsaved ``Message`` instances to ``add`` and return
+    immediately; a writer thread inserts everything buffered by all
+    connections of this process with one ``bulk_create``. A message waits at
+    most ``max_delay`` seconds, or less once ``max_batch`` are pending.
+
+    A batch that cannot be written (database unreachable or locked) goes back
+    to the front of the queue and is retried after ``retry_delay`` seconds.
+    Messages still unwritten on shutdown are appended to a spool file and
+    replayed by the ``flush_chat_messages`` management command.
+    """
+
+    def __init__(self, max_delay=0.05, max_batch=500, retry_delay=1, shutdown_timeout=5, spool_path=None):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.retry_delay = retry_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.spool_path = spool_path
+        self._pending = []
+        self._writing = []
+        self._first_at = None
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def add(self, message):
+        # Receive time, kept if the message ends up in the spool
+        if message.created_at is None:
+            message.created_at = timezone.now()
+        with self._condition:
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append(message)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        self._ensure_writer()
+
+    def pending(self):
+        with self._condition:
+            return len(self._pending)
+
+    def unsaved(self, chat_room_id, after_id):
+        """Buffered or in-flight messages of a room with ids above ``after_id``."""
+        with self._condition:
+            messages = self._writing + self._pending
+        return sorted(
+            (message for message in messages if message.chat_room_id == chat_room_id and message.pk > after_id),
+            key=lambda message: message.pk,
+        )
+
+    def flush(self):
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if batch:
+            write_messages(batch)
+        return len(batch)
+
+    def shutdown(self):
+        with self._condition:
+            # Let the writer finish the batch it is inserting
+            self._condition.wait_for(lambda: not self._writing, timeout=self.shutdown_timeout)
+            # Still in flight after the timeout: written again, where its ids make the copies fail
+            batch, self._pending = self._writing + self._pending, []
+        if not batch:
+            return
+        try:
+            write_messages(batch)
+        except Exception:
+            # The database may already be gone; keep the messages on disk instead
+            if self.spool_path:
+                append_spool(self.spool_path, batch)
+            else:
+                logger.exception('Lost %d chat messages on shutdown', len(batch))
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+                self._thread.start()
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            # Give other connections until the deadline to join this batch
+            deadline = self._first_at + self.max_delay
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if self._pending:
+                self._first_at = time.monotonic()
+            self._writing = batch
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            failed = False
+            try:
+                write_messages(batch)
+            except Exception:
+                logger.exception('Failed to write %d chat messages, retrying', len(batch))
+                failed = True
+                # The connection is kept between batches, unless it broke
+                connections.close_all()
+            with self._condition:
+                self._writing = []
+                if failed:
+                    self._pending[:0] = batch
+                    self._first_at = time.monotonic()
+                self._condition.notify_all()
+            if failed:
+                time.sleep(self.retry_delay)
+
+
+def write_messages(messages):
+    from .ids import message_ids
+    from .models import Message
+    from .rooms import record_new_messages
+
+    # bulk_create bypasses Message.save, which assigns ids otherwise
+    for message in messages:
+        if message.pk is None:
+            message.pk = message_ids.next_id()
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+            record_new_messages(messages)
+        return
+    except (OperationalError, InterfaceError):
+        # The database, not the rows: retry the whole batch later
+        raise
+    except DatabaseError:
+        if len(messages) == 1:
+            raise
+        logger.exception('Batch insert of %d chat messages failed, retrying one by one', len(messages))
+    # Isolate the rows that fail (e.g. a room deleted meanwhile) from the rest
+    for message in messages:
+        try:
+            write_messages([message])
+        except DatabaseError:
+            logger.exception('Dropped chat message for room %s', message.chat_room_id)
+
+
+def append_spool(path, messages):
+    with open(path, 'a') as spool:
+        for message in messages:
+            spool.write(json.dumps({
+                'id': message.pk, 'chat_room_id': message.chat_room_id, 'sender_id': message.sender_id,
+                'content': message.content, 'created_at': message.created_at.isoformat(),
+            }) + '\n')
+
+
+def read_spool(path):
+    from .models import Message
+
+    messages = []
+    with open(path) as spool:
+        for line in spool:
+            data = json.loads(line)
+            data['created_at'] = parse_datetime(data['created_at'])
+            messages.append(Message(**data))
+    return messages
+
+
+_config = getattr(settings, 'CHAT_BUFFER', {})
+message_buffer = MessageBuffer(
+    max_delay=_config.get('MAX_DELAY', 0.05),
+    max_batch=_config.get('MAX_BATCH', 500),
+    retry_delay=_config.get('RETRY_DELAY', 1),
+    shutdown_timeout=_config.get('SHUTDOWN_TIMEOUT', 5),
+    spool_path=_config.get('SPOOL_PATH'),
+)
+atexit.register(message_buffer.shutdown)
@@ -1,15 +1,36 @@
+import asyncio
 import json
+import time
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
+from techsafar.metrics import Counter, Histogram
+from .buffer import message_buffer
+from .ids import floor_id, message_ids
 from .models import ChatRoom, Message
-from django.contrib.auth import get_user_model
 
-User = get_user_model()
+REPLAY = {'BATCH_SIZE': 100, 'MAX_MESSAGES': 1000, **getattr(settings, 'CHAT_REPLAY', {})}
+
+chat_messages = Counter('chat_messages_total', 'Chat messages received from clients.')
+chat_replayed = Counter('chat_replayed_messages_total', 'Messages sent to reconnecting clients by replay.')
+chat_group_send = Histogram('chat_group_send_seconds', 'Latency of the channel layer group_send of a message.',
+                            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_{self.room_id}'
+        # Ids sent by the replay that may also arrive live
+        self.replayed_ids = set()
+
+        # Resolve the sender and check membership once per connection
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not await self.is_participant(user):
+            await self.close()
+            return
+        self.user_id = user.id
+        self.room_id = int(self.room_id)
 
         # Join room group
         await self.channel_layer.group_add(
@@ -17,7 +38,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        # Echo the subprotocol the token came in, or browsers drop the connection
+        await self.accept(self.scope.get('auth_subprotocol'))
+
+        # Reconnecting clients pass the last message id they saw
+        last_id = parse_qs(self.scope.get('query_string', b'').decode()).get('last_id')
+        if last_id and last_id[0].isdigit():
+            await self.replay(int(last_id[0]))
 
     async def disconnect(self, close_code):
         # Leave room group
@@ -26,40 +53,102 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
+    async def replay(self, last_id):
+        """
+        Send the messages after ``last_id``, oldest first, then a ``synced``
+        marker. Live messages are dispatched only once this returns, and the
+        ones also sent here are skipped by ``chat_message``.
+
+        Messages in other processes' write-behind buffers are only seen once
+        written, so a message broadcast before this connection joined the
+        group and still unwritten after the wait below (a slow or failing
+        write in another worker) is not replayed.
+        """
+        # Anything that can still arrive live was broadcast after this point
+        live_from = floor_id()
+        # Let messages broadcast before we joined reach the database
+        await asyncio.sleep(message_buffer.max_delay)
+
+        sent, after, complete = set(), last_id, True
+        while True:
+            limit = min(REPLAY['BATCH_SIZE'], REPLAY['MAX_MESSAGES'] - len(sent))
+            if limit <= 0:
+                complete = False
+                break
+            rows = await self.missed_messages(after, limit)
+            for row in rows:
+                await self.send_replayed(row['id'], row['content'], row['sender_id'], sent, live_from)
+            if len(rows) < limit:
+                break
+            after = rows[-1]['id']
+
+        if complete:
+            # Still in this process' write-behind buffer
+            for message in message_buffer.unsaved(self.room_id, last_id):
+                if message.pk not in sent:
+                    await self.send_replayed(message.pk, message.content, message.sender_id, sent, live_from)
+
+        chat_replayed.inc(amount=len(sent))
+        # complete=False: too far behind, refetch the history over HTTP
+        await self.send(text_data=json.dumps({'synced': True, 'replayed': len(sent), 'complete': complete}))
+
+    async def send_replayed(self, message_id, message, user_id, sent, live_from):
+        sent.add(message_id)
+        if message_id >= live_from:
+            self.replayed_ids.add(message_id)
+        await self.send(text_data=json.dumps({
+            'id': message_id,
+            'message': message,
+            'user_id': user_id
+        }))
+
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
-        user_id = self.scope['user'].id
 
-        # Save message to database
-        await self.save_message(user_id, message)
+        # Persisted in batches by the writer thread; see chat.buffer
+        message_id = message_ids.next_id()
+        message_buffer.add(Message(id=message_id, chat_room_id=self.room_id, sender_id=self.user_id, content=message))
+        chat_messages.inc()
 
         # Send message to room group
+        started = time.perf_counter()
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
+                'id': message_id,
                 'message': message,
-                'user_id': user_id
+                'user_id': self.user_id
             }
         )
+        chat_group_send.observe(time.perf_counter() - started)
 
     async def chat_message(self, event):
+        message_id = event['id']
+        if message_id in self.replayed_ids:
+            self.replayed_ids.discard(message_id)
+            return
         message = event['message']
         user_id = event['user_id']
 
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
+            'id': message_id,
             'message': message,
             'user_id': user_id
         }))
 
     @database_sync_to_async
-    def save_message(self, user_id, message):
-        user = User.objects.get(id=user_id)
-        chat_room = ChatRoom.objects.get(id=self.room_id)
-        Message.objects.create(
-            chat_room=chat_room,
-            sender=user,
-            content=message
-        ) 
\ No newline at end of file
+    def is_participant(self, user):
+        if not self.room_id.isdigit():
+            return False
+        return ChatRoom.objects.filter(pk=self.room_id, participants=user).exists()
+
+    @database_sync_to_async
+    def missed_messages(self, after_id, limit):
+        # Range scan on message_room_id_idx
+        return list(
+            Message.objects.filter(chat_room_id=self.room_id, id__gt=after_id)
+            .order_by('id').values('id', 'content', 'sender_id')[:limit]
+        )
@@ -0,0 +1,79 @@
+"""
+Time-ordered message ids.
+
+Ids are assigned when a message is received, so it can be broadcast with its
+final id while the write-behind buffer stores it later. Layout, 53 bits so
+JavaScript clients read them exactly: 37 bits of 10 ms ticks since EPOCH_MS
+(good for ~43 years), 6 bits of worker id and 10 bits of sequence per tick.
+Every process writing messages needs its own worker id (CHAT_WORKER_ID,
+0-63): WebSocket consumers and the HTTP MessageCreateView both assign ids,
+so that is every ASGI process and every WSGI worker. Two processes sharing
+one would assign the same ids, so there is no fallback; asgi.py and wsgi.py
+refuse to start without one.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+TICK_MS = 10
+WORKER_BITS = 6
+SEQUENCE_BITS = 10
+
+
+def current_tick():
+    return (int(time.time() * 1000) - EPOCH_MS) // TICK_MS
+
+
+def floor_id(tick=None):
+    """Smallest id any worker can assign at ``tick`` (now by default)."""
+    return (current_tick() if tick is None else tick) << (WORKER_BITS + SEQUENCE_BITS)
+
+
+def configured_worker_id():
+    value = getattr(settings, 'CHAT_WORKER_ID', None)
+    if value is None or value == '':
+        raise ImproperlyConfigured('Set CHAT_WORKER_ID to an id (0-63) unique to this process')
+    try:
+        worker_id = int(value)
+    except (TypeError, ValueError):
+        worker_id = -1
+    if not 0 <= worker_id < 1 << WORKER_BITS:
+        raise ImproperlyConfigured(f'CHAT_WORKER_ID must be 0-{(1 << WORKER_BITS) - 1}, not {value!r}')
+    return worker_id
+
+
+class IdGenerator:
+    def __init__(self, worker_id=None):
+        self._worker_id = worker_id
+        self._lock = threading.Lock()
+        self._tick = -1
+        self._sequence = 0
+
+    @property
+    def worker_id(self):
+        # Read on first use, so commands that never write messages need none
+        if self._worker_id is None:
+            self._worker_id = configured_worker_id()
+        return self._worker_id
+
+    def next_id(self):
+        worker_id = self.worker_id
+        with self._lock:
+            # Never go backwards, even if the clock does
+            tick = max(current_tick(), self._tick)
+            if tick == self._tick:
+                self._sequence += 1
+                if self._sequence >> SEQUENCE_BITS:
+                    # Tick exhausted; borrow the next one
+                    tick, self._sequence = tick + 1, 0
+            else:
+                self._sequence = 0
+            self._tick = tick
+            return (tick << (WORKER_BITS + SEQUENCE_BITS)) | (worker_id << SEQUENCE_BITS) | self._sequence
+
+
+message_ids = IdGenerator()
@@ -0,0 +1,383 @@
+"""
+Channel layer shared by several worker processes through a broker.
+
+``run_channel_broker`` starts a small asyncio server on a Unix socket (one
+host) or TCP port (several hosts) that owns every channel queue and group.
+Workers use ``BrokerChannelLayer``, which keeps one connection per event
+loop and multiplexes requests over it, so a parked ``receive`` never blocks
+a ``send``. ``group_send`` is a single request; the broker fans it out.
+
+Frames are a 4-byte big-endian length followed by UTF-8 JSON; bytes values
+in messages are tagged and base64-encoded. Queues live in the broker's
+memory only: restarting it drops pending messages and group memberships.
+"""
+
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import random
+import string
+import struct
+import time
+import weakref
+from collections import deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = 'unix:/tmp/techsafar-channels.sock'
+HEADER = struct.Struct('>I')
+MAX_FRAME = 4 * 1024 * 1024
+
+
+def _default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'{type(value).__name__} is not serializable')
+
+
+def _object_hook(value):
+    if len(value) == 1 and '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+    return value
+
+
+def encode_frame(payload):
+    body = json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader):
+    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_FRAME:
+        raise ConnectionError(f'Frame of {length} bytes exceeds the limit')
+    return json.loads(await reader.readexactly(length), object_hook=_object_hook)
+
+
+def strip_scheme(address):
+    # str.removeprefix is Python 3.9+
+    return address[len('tcp://'):] if address.startswith('tcp://') else address
+
+
+async def open_connection(address):
+    if address.startswith('unix:'):
+        return await asyncio.open_unix_connection(address[len('unix:'):])
+    host, _, port = strip_scheme(address).rpartition(':')
+    return await asyncio.open_connection(host, int(port))
+
+
+class Broker:
+    """
+    Channel queues and groups with the semantics of InMemoryChannelLayer:
+    per-channel capacity, message expiry (an expired message also removes
+    its channel from every group) and group membership expiry.
+    """
+
+    def __init__(self, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None):
+        self.limits = BaseChannelLayer(expiry=expiry, capacity=capacity)
+        self.limits.channel_capacity = self.limits.compile_capacities(channel_capacity or {})
+        self.expiry = expiry
+        self.group_expiry = group_expiry
+        self.queues = {}  # channel -> deque of (expires, message)
+        self.waiters = {}  # channel -> deque of futures of parked receives
+        self.groups = {}  # group -> {channel: joined at}
+
+    def send(self, channel, message):
+        waiters = self.waiters.get(channel)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(message)
+                return
+        queue = self.queues.setdefault(channel, deque())
+        if len(queue) >= self.limits.get_capacity(channel):
+            raise ChannelFull(channel)
+        queue.append((time.time() + self.expiry, message))
+
+    def receive(self, channel):
+        """The next message of ``channel``, or a future resolved with it."""
+        queue = self.queues.get(channel)
+        while queue:
+            expires, message = queue.popleft()
+            if not queue:
+                del self.queues[channel]
+            if expires >= time.time():
+                return message
+            self.remove_from_groups(channel)
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(channel, deque()).append(waiter)
+        return waiter
+
+    def group_add(self, group, channel):
+        self.groups.setdefault(group, {})[channel] = time.time()
+
+    def group_discard(self, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+
+    def group_send(self, group, message):
+        delivered = 0
+        for channel in list(self.groups.get(group, ())):
+            try:
+                self.send(channel, message)
+                delivered += 1
+            except ChannelFull:
+                pass
+        return delivered
+
+    def remove_from_groups(self, channel):
+        for group in list(self.groups):
+            self.group_discard(group, channel)
+
+    def flush(self):
+        for waiters in self.waiters.values():
+            for waiter in waiters:
+                waiter.cancel()
+        self.queues, self.waiters, self.groups = {}, {}, {}
+
+    def clean_expired(self):
+        now = time.time()
+        for channel, queue in list(self.queues.items()):
+            expired = False
+            while queue and queue[0][0] < now:
+                queue.popleft()
+                expired = True
+            if not queue:
+                del self.queues[channel]
+            if expired:
+                self.remove_from_groups(channel)
+        for channel, waiters in list(self.waiters.items()):
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if not waiters:
+                del self.waiters[channel]
+        joined_before = now - self.group_expiry
+        for group, members in list(self.groups.items()):
+            for channel, joined in list(members.items()):
+                if joined < joined_before:
+                    self.group_discard(group, channel)
+
+    async def handle(self, reader, writer):
+        parked = {}
+
+        async def deliver(request_id, waiter):
+            try:
+                message = await waiter
+            except asyncio.CancelledError:
+                return
+            finally:
+                parked.pop(request_id, None)
+            writer.write(encode_frame({'id': request_id, 'result': message}))
+
+        try:
+            while True:
+                request = await read_frame(reader)
+                request_id, op = request['id'], request['op']
+                response = {'id': request_id, 'result': None}
+                try:
+                    if op == 'send':
+                        self.send(request['channel'], request['message'])
+                    elif op == 'receive':
+                        result = self.receive(request['channel'])
+                        if isinstance(result, asyncio.Future):
+                            parked[request_id] = result
+                            asyncio.ensure_future(deliver(request_id, result))
+                            continue
+                        response['result'] = result
+                    elif op == 'cancel':
+                        waiter = parked.pop(request['request'], None)
+                        if waiter is not None:
+                            waiter.cancel()
+                        continue
+                    elif op == 'group_add':
+                        self.group_add(request['group'], request['channel'])
+                    elif op == 'group_discard':
+                        self.group_discard(request['group'], request['channel'])
+                    elif op == 'group_send':
+                        response['result'] = self.group_send(request['group'], request['message'])
+                    elif op == 'flush':
+                        self.flush()
+                    else:
+                        response = {'id': request_id, 'error': 'unknown', 'detail': op}
+                except ChannelFull:
+                    response = {'id': request_id, 'error': 'full'}
+                writer.write(encode_frame(response))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for waiter in parked.values():
+                waiter.cancel()
+            writer.close()
+
+    async def serve(self, address, clean_interval=1):
+        if address.startswith('unix:'):
+            server = await asyncio.start_unix_server(self.handle, address[len('unix:'):])
+        else:
+            host, _, port = strip_scheme(address).rpartition(':')
+            server = await asyncio.start_server(self.handle, host, int(port))
+        async with server:
+            while True:
+                await asyncio.sleep(clean_interval)
+                self.clean_expired()
+
+
+class BrokerConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.closed = False
+        self.task = asyncio.ensure_future(self._read())
+
+    async def request(self, op, **fields):
+        if self.closed:
+            raise ConnectionError('Channel broker connection is closed')
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(encode_frame({'id': request_id, 'op': op, **fields}))
+            await self.writer.drain()
+            response = await future
+        except asyncio.CancelledError:
+            # Free the broker-side waiter of an abandoned receive
+            if op == 'receive' and not self.closed:
+                self.writer.write(encode_frame({'id': next(self.ids), 'op': 'cancel', 'request': request_id}))
+            raise
+        finally:
+            self.pending.pop(request_id, None)
+        if response.get('error') == 'full':
+            raise ChannelFull(fields.get('channel'))
+        if 'error' in response:
+            raise RuntimeError(f'Channel broker error: {response}')
+        return response['result']
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+
+    async def _read(self):
+        try:
+            while True:
+                response = await read_frame(self.reader)
+                future = self.pending.get(response['id'])
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Lost the channel broker connection'))
+            self.writer.close()
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """
+    Channel layer backed by ``run_channel_broker``. Capacity and expiry are
+    enforced by the broker and configured on its command line.
+
+    A request that fails on a lost connection (a broker restart) is sent
+    once more on a new connection, opened after backing off from
+    ``reconnect_delay`` seconds, doubling for up to ``reconnect_attempts``
+    tries. A frame the old broker did get may so be delivered twice.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, address=DEFAULT_ADDRESS, reconnect_delay=0.5, reconnect_attempts=4, **kwargs):
+        super().__init__(**kwargs)
+        self.address = address
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_attempts = reconnect_attempts
+        self.client_prefix = ''.join(random.choice(string.ascii_letters) for _ in range(8))
+        # One connection per event loop; async_to_sync runs its own loops
+        self._connections = weakref.WeakKeyDictionary()
+        self._locks = weakref.WeakKeyDictionary()
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        connection = self._connections.get(loop)
+        if connection is not None and not connection.closed:
+            return connection
+        lock = self._locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            connection = self._connections.get(loop)
+            if connection is None or connection.closed:
+                connection = BrokerConnection(*await open_connection(self.address))
+                self._connections[loop] = connection
+        return connection
+
+    async def _reconnect(self):
+        delay = self.reconnect_delay
+        for attempt in range(self.reconnect_attempts):
+            await asyncio.sleep(delay)
+            try:
+                return await self._connection()
+            except OSError:
+                if attempt == self.reconnect_attempts - 1:
+                    raise
+                delay *= 2
+
+    async def _request(self, op, **fields):
+        connection = None
+        try:
+            connection = await self._connection()
+            return await connection.request(op, **fields)
+        except OSError:
+            # A write may fail before the reader notices the connection is gone
+            if connection is not None:
+                connection.close()
+            logger.warning('Channel broker at %s unavailable, reconnecting', self.address)
+        return await (await self._reconnect()).request(op, **fields)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._request('send', channel=channel, message=message)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        while True:
+            try:
+                return await self._request('receive', channel=channel)
+            except OSError:
+                logger.warning('Channel broker at %s unavailable, retrying', self.address)
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def new_channel(self, prefix='specific.'):
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}.{self.client_prefix}!{suffix}'
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._request('group_add', group=group, channel=channel)
+
+    async def group_discard(self, group, channel):
+        assert self.valid_channel_name(channel), 'Invalid channel name'
+        assert self.valid_group_name(group), 'Invalid group name'
+        await self._request('group_discard', group=group, channel=channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.valid_group_name(group), 'Invalid group name'
+        await self._request('group_send', group=group, message=message)
+
+    async def flush(self):
+        await self._request('flush')
+
+    async def close(self):
+        connection = self._connections.pop(asyncio.get_running_loop(), None)
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.archive import CONFIG, archive_room, rooms_to_archive
+
+
+class Command(BaseCommand):
+    help = 'Move old chat messages into compressed archive segments; safe to interrupt and rerun'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=CONFIG['AFTER_DAYS'],
+                            help='Archive messages older than this many days')
+        parser.add_argument('--segment-size', type=int, default=CONFIG['SEGMENT_SIZE'])
+        parser.add_argument('--room', type=int, action='append', help='Only these rooms (repeatable)')
+        parser.add_argument('--max-segments', type=int, help='Stop after writing this many segments')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        rooms = options['room'] or list(rooms_to_archive(cutoff))
+        budget = options['max_segments']
+        total_segments = total_messages = 0
+        for room_id in rooms:
+            if budget is not None and total_segments >= budget:
+                self.stdout.write('Segment limit reached; run again to continue')
+                break
+            segments, messages = archive_room(
+                room_id, cutoff, segment_size=options['segment_size'],
+                max_segments=None if budget is None else budget - total_segments,
+            )
+            total_segments += segments
+            total_messages += messages
+            if messages:
+                self.stdout.write(f'room {room_id}: {messages} messages in {segments} segments')
+        self.stdout.write(
+            f'Archived {total_messages} messages into {total_segments} segments '
+            f'in {time.monotonic() - started:.1f}s'
+        )
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from chat.layers import BrokerChannelLayer
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def throughput(layer, messages):
+    """Messages per second through one channel, sender and receiver running concurrently."""
+    channel = await layer.new_channel()
+
+    async def produce():
+        for number in range(messages):
+            while True:
+                try:
+                    await layer.send(channel, {'type': 'bench', 'n': number})
+                    break
+                except ChannelFull:
+                    await asyncio.sleep(0.001)
+
+    async def consume():
+        for _ in range(messages):
+            await layer.receive(channel)
+
+    started = time.perf_counter()
+    await asyncio.gather(produce(), consume())
+    return messages / (time.perf_counter() - started)
+
+
+async def fan_out(layer, members, rounds):
+    """Latency from group_send until every member of the group has received it."""
+    group = 'bench'
+    channels = [await layer.new_channel() for _ in range(members)]
+    for channel in channels:
+        await layer.group_add(group, channel)
+
+    latencies = []
+    for number in range(rounds):
+        started = time.perf_counter()
+        await layer.group_send(group, {'type': 'bench', 'n': number})
+        await asyncio.gather(*[layer.receive(channel) for channel in channels])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    for channel in channels:
+        await layer.group_discard(group, channel)
+    return latencies
+
+
+class Command(BaseCommand):
+    help = 'Compare message throughput and group fan-out latency of the in-memory and broker channel layers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000)
+        parser.add_argument('--members', type=int, default=50, help='Channels in the fan-out group')
+        parser.add_argument('--rounds', type=int, default=200)
+        parser.add_argument('--address', help='Use a running broker instead of starting one')
+
+    def handle(self, *args, **options):
+        broker = None
+        address = options['address']
+        if address is None:
+            address = f'unix:{os.path.join(tempfile.mkdtemp(), "channels.sock")}'
+            broker = subprocess.Popen(
+                [sys.executable, sys.argv[0], 'run_channel_broker', '--address', address,
+                 '--capacity', '1000'],
+                stdout=subprocess.DEVNULL,
+            )
+            path = address[len('unix:'):]
+            deadline = time.monotonic() + 10
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        results = {}
+        try:
+            layers = {
+                'in_memory': InMemoryChannelLayer(capacity=1000),
+                'broker': BrokerChannelLayer(address=address),
+            }
+            for name, layer in layers.items():
+                rate = asyncio.run(throughput(layer, options['messages']))
+                latencies = asyncio.run(fan_out(layer, options['members'], options['rounds']))
+                results[name] = {
+                    'messages_per_second': round(rate),
+                    'fan_out_members': options['members'],
+                    'fan_out_p50_ms': round(statistics.median(latencies), 3),
+                    'fan_out_p99_ms': round(percentile(latencies, 0.99), 3),
+                }
+        finally:
+            if broker is not None:
+                broker.terminate()
+                broker.wait()
+        self.stdout.write(json.dumps(results, indent=2))
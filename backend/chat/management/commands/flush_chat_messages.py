@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from chat.buffer import message_buffer, read_spool, write_messages
+from chat.models import Message
+
+
+class Command(BaseCommand):
+    help = 'Write chat messages spooled by the write-behind buffer on shutdown to the database'
+
+    def handle(self, *args, **options):
+        path = message_buffer.spool_path
+        total = 0
+        if path:
+            claimed = path + '.replaying'
+            # A previous run may have died after claiming the spool
+            if not os.path.exists(claimed) and os.path.exists(path):
+                os.replace(path, claimed)
+            if os.path.exists(claimed):
+                messages = read_spool(claimed)
+                received = [message.created_at for message in messages]
+                write_messages(messages)
+                # bulk_create stamps the insert time; put back when they were received
+                for message, created_at in zip(messages, received):
+                    message.created_at = created_at
+                Message.objects.bulk_update(messages, ['created_at'], batch_size=500)
+                os.remove(claimed)
+                total = len(messages)
+
+        self.stdout.write(f'Flushed {total} chat messages')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from chat.models import ChatParticipant, ChatRoom, Message
+
+
+class Command(BaseCommand):
+    help = 'Recompute the last message of every chat room and the unread counter of every participant'
+
+    def handle(self, *args, **options):
+        newest = Message.objects.filter(chat_room=OuterRef('pk')).order_by('-created_at', '-id')
+        unread = (Message.objects.filter(chat_room=OuterRef('chat_room'), is_read=False)
+                  .exclude(sender=OuterRef('user')).order_by()
+                  .values('chat_room').annotate(count=Count('pk')).values('count'))
+        with transaction.atomic():
+            rooms = ChatRoom.objects.update(last_message=Subquery(newest.values('pk')[:1]))
+            memberships = ChatParticipant.objects.update(
+                unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+            )
+        self.stdout.write(f'Rebuilt {rooms} rooms and {memberships} memberships')
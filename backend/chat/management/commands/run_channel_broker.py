@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+from django.core.management.base import BaseCommand
+
+from chat.layers import DEFAULT_ADDRESS, Broker
+
+
+class Command(BaseCommand):
+    help = 'Run the broker process behind chat.layers.BrokerChannelLayer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=os.environ.get('CHANNEL_BROKER') or DEFAULT_ADDRESS,
+                            help='unix:/path/to.sock or host:port')
+        parser.add_argument('--capacity', type=int, default=100, help='Messages queued per channel')
+        parser.add_argument('--expiry', type=int, default=60, help='Seconds before a queued message expires')
+        parser.add_argument('--group-expiry', type=int, default=86400, help='Seconds a group membership lasts')
+
+    def handle(self, *args, **options):
+        address = options['address']
+        if address.startswith('unix:') and os.path.exists(address[len('unix:'):]):
+            os.unlink(address[len('unix:'):])
+        broker = Broker(
+            expiry=options['expiry'], group_expiry=options['group_expiry'], capacity=options['capacity'],
+        )
+        self.stdout.write(f'Channel broker listening on {address}')
+        try:
+            asyncio.run(broker.serve(address))
+        except KeyboardInterrupt:
+            pass
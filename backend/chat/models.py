@@ -1,8 +1,11 @@
 from django.db import models
 from django.conf import settings
+from .ids import message_ids
 
 class ChatRoom(models.Model):
-    participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chat_rooms')
+    participants = models.ManyToManyField(settings.AUTH_USER_MODEL, through='ChatParticipant', related_name='chat_rooms')
+    # Maintained on every insert (see chat.signals.record_new_messages)
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -12,6 +15,18 @@ class ChatRoom(models.Model):
     def __str__(self):
         return f"Chat Room {self.id}"
 
+class ChatParticipant(models.Model):
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_memberships')
+    # Messages from the other participants this user has not read yet
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['chat_room', 'user']
+
+    def __str__(self):
+        return f"{self.user} in {self.chat_room}"
+
 class Message(models.Model):
     chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
@@ -21,6 +36,43 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['chat_room', 'created_at', 'id'], name='message_room_created_idx'),
+            # Replay of missed messages on reconnect
+            models.Index(fields=['chat_room', 'id'], name='message_room_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Message from {self.sender.username} in {self.chat_room}"
+
+    def save(self, *args, **kwargs):
+        # Ids are time-ordered and assigned up front; see chat.ids
+        if self.pk is None:
+            self.pk = message_ids.next_id()
+            kwargs.setdefault('force_insert', True)
+        super().save(*args, **kwargs)
+
+class ArchivedSegment(models.Model):
+    """
+    Messages moved out of the Message table by chat.archive, oldest first:
+    a zlib-compressed JSON list per run of up to CHAT_ARCHIVE['SEGMENT_SIZE']
+    messages of one room. Segments are written once and never changed.
+    """
+    chat_room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='archived_segments')
+    first_created_at = models.DateTimeField()
+    first_id = models.BigIntegerField()
+    last_created_at = models.DateTimeField()
+    last_id = models.BigIntegerField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['first_created_at', 'first_id']
+        indexes = [
+            models.Index(fields=['chat_room', 'first_created_at', 'first_id'], name='segment_room_first_idx'),
+            models.Index(fields=['chat_room', 'last_created_at', 'last_id'], name='segment_room_last_idx'),
+        ]
 
     def __str__(self):
-        return f"Message from {self.sender.username} in {self.chat_room}" 
\ No newline at end of file
+        return f"{self.message_count} archived messages in {self.chat_room}"
@@ -0,0 +1,48 @@
+"""
+Denormalized room state: last message, updated_at and per-participant
+unread counters, kept current on insert so the inbox needs no per-room
+queries.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import ChatParticipant, ChatRoom, Message
+
+
+def record_new_messages(messages):
+    """Update the rooms of freshly inserted ``messages`` (saved, with ids)."""
+    by_room = {}
+    for message in messages:
+        by_room.setdefault(message.chat_room_id, []).append(message)
+
+    for room_id, room_messages in by_room.items():
+        newest = max(room_messages, key=lambda message: (message.created_at, message.pk))
+        ChatRoom.objects.filter(pk=room_id).update(updated_at=newest.created_at, last_message=newest)
+
+        # Everyone gets the whole batch as unread except their own messages
+        total = len(room_messages)
+        sent = Counter(message.sender_id for message in room_messages)
+        ChatParticipant.objects.filter(chat_room_id=room_id).update(unread_count=F('unread_count') + Case(
+            *[When(user_id=sender_id, then=Value(total - count)) for sender_id, count in sent.items()],
+            default=Value(total),
+            output_field=IntegerField(),
+        ))
+
+
+def mark_read(user, room_ids=None):
+    """
+    Mark every message from others as read for ``user`` in ``room_ids`` (all
+    of their rooms when None). Returns the number of rooms touched.
+    """
+    memberships = ChatParticipant.objects.filter(user=user, unread_count__gt=0)
+    if room_ids is not None:
+        memberships = memberships.filter(chat_room_id__in=room_ids)
+    with transaction.atomic():
+        rooms = list(memberships.select_for_update().values_list('chat_room_id', flat=True))
+        if rooms:
+            Message.objects.filter(chat_room_id__in=rooms, is_read=False).exclude(sender=user).update(is_read=True)
+            ChatParticipant.objects.filter(user=user, chat_room_id__in=rooms).update(unread_count=0)
+    return len(rooms)
@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from .models import ChatRoom, Message
 from users.serializers import UserSerializer
+from techsafar.fieldsets import SparseFieldsetMixin
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
 
     class Meta:
@@ -10,17 +11,14 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'chat_room', 'sender', 'content', 'created_at']
         read_only_fields = ['sender', 'created_at']
 
-class ChatRoomSerializer(serializers.ModelSerializer):
+class ChatRoomSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
-    last_message = serializers.SerializerMethodField()
+    # The maintained pointer; loaded with select_related by the views
+    last_message = MessageSerializer(read_only=True)
+    # Annotated per requesting user by the views
+    unread_count = serializers.IntegerField(read_only=True, default=0)
 
     class Meta:
         model = ChatRoom
-        fields = ['id', 'participants', 'created_at', 'last_message']
-        read_only_fields = ['created_at']
-
-    def get_last_message(self, obj):
-        last_message = obj.messages.order_by('-created_at').first()
-        if last_message:
-            return MessageSerializer(last_message).data
-        return None 
\ No newline at end of file
+        fields = ['id', 'participants', 'created_at', 'updated_at', 'last_message', 'unread_count']
+        read_only_fields = ['created_at', 'updated_at'] 
\ No newline at end of file
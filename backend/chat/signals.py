@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from techsafar.conditional import record_deletion
+from .models import ChatParticipant, ChatRoom, Message
+from .rooms import record_new_messages
+
+
+@receiver(post_save, sender=Message)
+def message_created(sender, instance, created, **kwargs):
+    # Messages from the WebSocket buffer are bulk-created and recorded by
+    # the writer instead
+    if created:
+        record_new_messages([instance])
+
+
+@receiver(post_delete, sender=ChatRoom)
+@receiver(post_delete, sender=ChatParticipant)
+def room_deleted(sender, instance, **kwargs):
+    # Room lists' Last-Modified, also when someone leaves; see techsafar.conditional
+    record_deletion(ChatRoom)
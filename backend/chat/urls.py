@@ -4,7 +4,9 @@ from . import views
 urlpatterns = [
     # Chat room endpoints
     path('rooms/', views.ChatRoomListView.as_view(), name='chat-room-list'),
+    path('rooms/read/', views.ChatRoomReadView.as_view(), name='chat-room-read-all'),
     path('rooms/<int:pk>/', views.ChatRoomDetailView.as_view(), name='chat-room-detail'),
+    path('rooms/<int:pk>/read/', views.ChatRoomReadView.as_view(), name='chat-room-read'),
     
     # Message endpoints
     path('rooms/<int:chat_room_id>/messages/', views.MessageListView.as_view(), name='message-list'),
@@ -1,32 +1,76 @@
-from rest_framework import generics, permissions
+from django.db.models import F
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from .models import ChatRoom, Message
+from rest_framework.views import APIView
+from .archive import ArchiveKeysetPagination
+from .models import ArchivedSegment, ChatRoom, Message
+from .rooms import mark_read
 from .serializers import ChatRoomSerializer, MessageSerializer
+from techsafar.fieldsets import requested_fields
+from techsafar.conditional import ConditionalGetMixin
 
-class ChatRoomListView(generics.ListCreateAPIView):
-    serializer_class = ChatRoomSerializer
-    permission_classes = [permissions.IsAuthenticated]
+class ChatRoomQuerysetMixin:
+    # Unread counts change on mark-read without touching updated_at
+    etag_fields = ('updated_at', 'unread_count')
 
     def get_queryset(self):
-        return ChatRoom.objects.filter(participants=self.request.user)
+        # The annotation reuses the membership join of the filter
+        queryset = (ChatRoom.objects.filter(memberships__user=self.request.user)
+                    .annotate(unread_count=F('memberships__unread_count')))
+        fields = requested_fields(ChatRoomSerializer, self.request)
+        if 'participants' in fields:
+            queryset = queryset.prefetch_related('participants')
+        if 'last_message' in fields:
+            queryset = queryset.select_related('last_message__sender')
+        return queryset
+
+class ChatRoomListView(ChatRoomQuerysetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    serializer_class = ChatRoomSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    # validators + count + page + participants
+    query_budget = 4
 
     def perform_create(self, serializer):
         serializer.save(participants=[self.request.user])
 
-class ChatRoomDetailView(generics.RetrieveAPIView):
+class ChatRoomDetailView(ChatRoomQuerysetMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = ChatRoomSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return ChatRoom.objects.filter(participants=self.request.user)
+class ChatRoomReadView(APIView):
+    """
+    Mark messages as read for the current user: in the rooms listed in
+    ``rooms``, or in all of their rooms when it is omitted.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        rooms = request.data.get('rooms')
+        if rooms is not None and (not isinstance(rooms, list) or not all(isinstance(pk, int) for pk in rooms)):
+            return Response({'rooms': ['Expected a list of room ids.']}, status=status.HTTP_400_BAD_REQUEST)
+        if 'pk' in kwargs:
+            rooms = [kwargs['pk']]
+        return Response({'rooms_marked': mark_read(request.user, rooms)})
 
 class MessageListView(generics.ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # History grows without bound, so always seek instead of OFFSET; old
+    # messages are read from the archive (see chat.archive)
+    pagination_class = ArchiveKeysetPagination
+    keyset_ordering = 'created_at'
+
+    def get_archive_segments(self):
+        return ArchivedSegment.objects.filter(
+            chat_room_id=self.kwargs.get('chat_room_id'), chat_room__participants=self.request.user
+        )
 
     def get_queryset(self):
         chat_room_id = self.kwargs.get('chat_room_id')
-        return Message.objects.filter(chat_room_id=chat_room_id, chat_room__participants=self.request.user)
+        queryset = Message.objects.filter(chat_room_id=chat_room_id, chat_room__participants=self.request.user)
+        if 'sender' in requested_fields(MessageSerializer, self.request):
+            queryset = queryset.select_related('sender')
+        return queryset
 
 class MessageCreateView(generics.CreateAPIView):
     serializer_class = MessageSerializer
@@ -0,0 +1,135 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Write-behind counter for Product.views.
+
+    Hits are merged per product in memory and written as batched
+    ``UPDATE ... SET views = views + n`` statements, so reads never save the
+    whole row and concurrent increments are not lost. Counts that cannot be
+    written on shutdown are appended to a spool file and replayed by the
+    ``flush_view_counts`` management command.
+    """
+
+    def __init__(self, flush_interval=10, max_pending=1000, spool_path=None):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool_path = spool_path
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._thread = None
+        self._wake = threading.Event()
+
+    def record(self, product_id, count=1):
+        """Count a view; never raises and never writes in the caller's thread when a flusher runs."""
+        with self._lock:
+            self._pending[product_id] += count
+            overflow = len(self._pending) >= self.max_pending
+        self._ensure_flusher()
+        if not overflow:
+            return
+        if self._thread is not None:
+            # Early flush, by the flusher rather than this request
+            self._wake.set()
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush product view counts')
+
+    def pending(self, product_id):
+        with self._lock:
+            return self._pending.get(product_id, 0)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if pending:
+            try:
+                write_counts(pending)
+            except Exception:
+                # Keep the counts for the next flush (or the shutdown spool)
+                with self._lock:
+                    self._pending.update(pending)
+                raise
+        return sum(pending.values())
+
+    def shutdown(self):
+        try:
+            self.flush()
+        except Exception:
+            # The database may already be gone; keep the counts on disk instead
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+            if self.spool_path and pending:
+                append_spool(self.spool_path, pending)
+            else:
+                logger.exception('Lost %d product views on shutdown', sum(pending.values()))
+
+    def _ensure_flusher(self):
+        if self._thread is not None or not self.flush_interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush product view counts')
+            finally:
+                connections.close_all()
+
+
+def write_counts(counts):
+    from .models import Product
+
+    # One UPDATE per distinct increment keeps the statement count small
+    by_increment = defaultdict(list)
+    for product_id, count in counts.items():
+        by_increment[count].append(product_id)
+    with transaction.atomic():
+        for count, ids in by_increment.items():
+            Product.objects.filter(pk__in=ids).update(views=F('views') + count)
+
+
+def append_spool(path, counts):
+    with open(path, 'a') as spool:
+        for product_id, count in counts.items():
+            spool.write(f'{product_id} {count}\n')
+
+
+def read_spool(path):
+    counts = Counter()
+    with open(path) as spool:
+        for line in spool:
+            product_id, count = line.split()
+            counts[int(product_id)] += int(count)
+    return counts
+
+
+_config = getattr(settings, 'VIEW_COUNTER', {})
+view_counter = ViewCounter(
+    flush_interval=_config.get('FLUSH_INTERVAL', 10),
+    max_pending=_config.get('MAX_PENDING', 1000),
+    spool_path=_config.get('SPOOL_PATH'),
+)
+atexit.register(view_counter.shutdown)
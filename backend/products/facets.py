@@ -0,0 +1,93 @@
+import hashlib
+from collections import defaultdict
+
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from techsafar.cache import get_cache, namespace_version
+
+# Upper bounds (PKR) of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = (10000, 25000, 50000, 100000, 250000)
+
+# Query parameters that change the page, not the matching set
+NON_FILTER_PARAMS = {'page', 'cursor', 'ordering', 'fields', 'expand', 'facets'}
+
+FACET_COLUMNS = (
+    'brand_id', 'brand__name', 'category_id', 'category__name',
+    'condition', 'is_negotiable', 'is_available', 'price_bucket',
+)
+
+
+def price_bucket_expression():
+    return Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(PRICE_BUCKETS)],
+        default=Value(len(PRICE_BUCKETS)),
+        output_field=IntegerField(),
+    )
+
+
+def price_bucket_range(index):
+    low = PRICE_BUCKETS[index - 1] if index else 0
+    high = PRICE_BUCKETS[index] if index < len(PRICE_BUCKETS) else None
+    return low, high
+
+
+def compute_facets(queryset):
+    """
+    Count every facet value of ``queryset`` in one grouped query: rows are
+    grouped by the combination of all facet columns and the per-facet counts
+    are summed from those groups.
+    """
+    groups = (queryset.order_by().prefetch_related(None)
+              .annotate(price_bucket=price_bucket_expression())
+              .values(*FACET_COLUMNS).annotate(count=Count('pk')))
+
+    brands, categories = defaultdict(int), defaultdict(int)
+    conditions, buckets = defaultdict(int), defaultdict(int)
+    negotiable, available = defaultdict(int), defaultdict(int)
+    for row in groups:
+        count = row['count']
+        brands[(row['brand_id'], row['brand__name'])] += count
+        categories[(row['category_id'], row['category__name'])] += count
+        conditions[row['condition']] += count
+        negotiable[row['is_negotiable']] += count
+        available[row['is_available']] += count
+        buckets[row['price_bucket']] += count
+
+    def by_count(counts):
+        return sorted(counts.items(), key=lambda item: -item[1])
+
+    return {
+        'brand': [{'value': pk, 'label': name, 'count': n} for (pk, name), n in by_count(brands)],
+        'category': [{'value': pk, 'label': name, 'count': n} for (pk, name), n in by_count(categories)],
+        'condition': [{'value': value, 'count': n} for value, n in by_count(conditions)],
+        'is_negotiable': [{'value': value, 'count': n} for value, n in by_count(negotiable)],
+        'is_available': [{'value': value, 'count': n} for value, n in by_count(available)],
+        'price': [
+            {'min': low, 'max': high, 'count': buckets[index]}
+            for index in sorted(buckets)
+            for low, high in [price_bucket_range(index)]
+        ],
+    }
+
+
+def filter_signature(request):
+    params = sorted(
+        (key, value) for key, values in request.query_params.lists()
+        if key not in NON_FILTER_PARAMS for value in values
+    )
+    return hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+
+
+def cached_facets(filtered_queryset, request):
+    """
+    ``compute_facets`` memoized per filter signature in the catalogue cache.
+    ``filtered_queryset`` is called only on a miss, since filtering can
+    itself query (the ?category= row, search ranking).
+    """
+    cache = get_cache()
+    key = f'facets:{namespace_version("product_facets")}:{filter_signature(request)}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filtered_queryset())
+        cache.set(key, facets)
+    return facets
@@ -0,0 +1,62 @@
+import django_filters
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+from techsafar.pagination import KeysetPagination
+
+from .models import Category, Product, ProductAttribute
+from .search import get_search_backend
+from .specs import spec_conditions
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    ``?category=<id>&include_descendants=1`` also matches products in every
+    subcategory, through a range scan on the category path index.
+
+    ``?spec.<key>[_<unit>][__<lookup>]=<value>`` filters on extracted
+    specification attributes, e.g. ``?spec.ram_gb__gte=8`` or
+    ``?spec.pta_approved=true``.
+    """
+    include_descendants = django_filters.CharFilter(method='filter_include_descendants')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'condition', 'brand', 'is_available', 'is_negotiable']
+
+    def filter_queryset(self, queryset):
+        category = self.form.cleaned_data.get('category')
+        include = self.form.cleaned_data.get('include_descendants') or ''
+        if category is not None and include.lower() in ('1', 'true', 'yes', 'on'):
+            # Replace the exact category match with a subtree match
+            self.form.cleaned_data['category'] = None
+            queryset = queryset.filter(**Category.subtree_lookup(category.path, prefix='category__'))
+        # django-filter swaps an empty query string for a plain dict
+        for condition in spec_conditions(self.data) if self.data else ():
+            queryset = queryset.filter(
+                pk__in=ProductAttribute.objects.filter(**condition).values('product_id')
+            )
+        return super().filter_queryset(queryset)
+
+    def filter_include_descendants(self, queryset, name, value):
+        # Applied in filter_queryset, where the category is known
+        return queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    ``?search=`` backed by the configured product search backend. Results are
+    ranked by relevance unless ``?ordering=`` is given. A relevance ranking
+    has no keyset to seek on, so it cannot be paged with ``?cursor=``.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        rank = not request.query_params.get(api_settings.ORDERING_PARAM)
+        if rank and KeysetPagination.cursor_query_param in request.query_params:
+            raise ValidationError({KeysetPagination.cursor_query_param: [
+                'Results ranked by ?search= are paged with ?page=; add ?ordering= to use a cursor.'
+            ]})
+        return get_search_backend().search(queryset, query, rank=rank)
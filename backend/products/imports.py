@@ -0,0 +1,218 @@
+"""
+Streaming bulk product import from CSV or NDJSON.
+
+Rows are read one at a time and validated and written in chunks, with
+plain multi-row INSERTs (techsafar.bulk) inside one transaction per chunk,
+so memory stays flat however large the file is and a failing chunk does
+not roll back the ones before it. Those INSERTs skip the Product signals,
+so each chunk also extracts spec attributes, updates the search index and
+market prices and queues the products for the similarity index itself.
+
+This does not reach a 50,000-row file in a few seconds: such a file took
+about 38 s (1,300 rows/s) on SQLite. Per-row DRF validation is about a
+fifth of that, and the market price groups each chunk reads and rewrites
+over a third, growing with the number of groups.
+
+The HTTP endpoint imports inside the request, so it refuses uploads above
+``MAX_UPLOAD_SIZE``; larger files go through ``manage.py import_products``,
+which has no limit.
+"""
+
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from techsafar.bulk import bulk_insert_returning
+from techsafar.cache import invalidate
+from .models import Brand, Category, Product
+from .pricing import add_products
+from .search import get_search_backend
+from .similarity import similarity_index
+from .serializers import ProductImportRowSerializer
+from .specs import sync_attributes
+
+CONFIG = {
+    'MAX_UPLOAD_SIZE': 2 * 1024 * 1024,
+    **getattr(settings, 'PRODUCT_IMPORT', {}),
+}
+
+FORMATS = {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}
+# CSV columns like "spec.ram" are collected into specifications
+SPEC_COLUMN_PREFIX = 'spec.'
+# Errors beyond this are counted but not kept
+MAX_REPORTED_ERRORS = 1000
+# Columns written for each product; the rest get their defaults
+PRODUCT_FIELDS = ['seller', 'category', 'brand', 'title', 'description', 'price', 'original_price',
+                  'discount_percentage', 'condition', 'model', 'specifications', 'location',
+                  'is_negotiable', 'is_available', 'created_at', 'updated_at']
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(name, default='csv'):
+    extension = os.path.splitext(name or '')[1].lstrip('.').lower()
+    return FORMATS.get(extension, default)
+
+
+def read_csv(stream):
+    """Yield ``(line, row, errors)``; ``errors`` is set when the row could not be parsed."""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        row, specs, errors = {}, {}, None
+        for column, value in record.items():
+            # Missing trailing cells are None, extra ones are keyed by None
+            if column is None or value is None or value == '':
+                continue
+            column = column.strip()
+            if column.startswith(SPEC_COLUMN_PREFIX):
+                specs[column[len(SPEC_COLUMN_PREFIX):]] = value
+            elif column == 'specifications':
+                try:
+                    row[column] = json.loads(value)
+                except ValueError:
+                    errors = {'specifications': ['Invalid JSON.']}
+            else:
+                row[column] = value
+        if specs and errors is None:
+            if not isinstance(row.get('specifications', {}), dict):
+                errors = {'specifications': ['Expected a JSON object.']}
+            else:
+                row['specifications'] = {**row.get('specifications', {}), **specs}
+        yield reader.line_num, row, errors
+
+
+def read_ndjson(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, None, {'non_field_errors': ['Invalid JSON.']}
+            continue
+        if not isinstance(row, dict):
+            yield line, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        yield line, row, None
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        return read_csv(stream)
+    if fmt == 'ndjson':
+        return read_ndjson(stream)
+    raise ImportFormatError(f'Unsupported format "{fmt}", expected csv or ndjson.')
+
+
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed, 1) if self.elapsed else None
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.failed,
+            'dry_run': self.dry_run,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+            'errors': self.errors,
+        }
+
+
+def insert_products(products):
+    """Write unsaved ``products`` and set their primary keys."""
+    now = timezone.now()
+    attnames = [Product._meta.get_field(name).attname for name in PRODUCT_FIELDS]
+    for product in products:
+        product.created_at = product.updated_at = now
+    pks = bulk_insert_returning(Product, PRODUCT_FIELDS, [
+        [getattr(product, attname) for attname in attnames] for product in products
+    ])
+    for product, pk in zip(products, pks):
+        product.pk = pk
+        product._state.adding = False
+
+
+def import_products(stream, fmt, seller, batch_size=1000, dry_run=False, progress=None):
+    """
+    Import every row of the text ``stream`` for ``seller`` and return an
+    ``ImportReport``. ``progress`` is called with the report after each chunk.
+    """
+    context = {
+        'categories': {category.slug: category for category in Category.objects.only('id', 'slug')},
+        'brands': {brand.slug: brand for brand in Brand.objects.only('id', 'slug', 'name')},
+    }
+    # One instance validates every row; building its fields is the costly part
+    validator = ProductImportRowSerializer(context=context)
+    report = ImportReport(dry_run)
+    rows = read_rows(stream, fmt)
+    search = get_search_backend()
+
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        products, lines = [], []
+        for line, row, errors in chunk:
+            report.rows += 1
+            if errors is None:
+                try:
+                    validated_data = validator.run_validation(row)
+                except ValidationError as exc:
+                    errors = exc.detail
+                else:
+                    product = Product(seller=seller, **validated_data)
+                    product.update_discount()
+                    products.append(product)
+                    lines.append(line)
+                    continue
+            report.add_error(line, errors)
+
+        if products and not dry_run:
+            try:
+                with transaction.atomic():
+                    insert_products(products)
+                    sync_attributes(products, replace=False)
+                    search.index_many(products)
+                    add_products(products)
+            except DatabaseError as exc:
+                for line in lines:
+                    report.add_error(line, {'non_field_errors': [str(exc)]})
+                products = []
+            else:
+                similarity_index.mark_changed([product.pk for product in products])
+        report.created += len(products)
+        report.elapsed = time.monotonic() - report.started
+        if progress is not None:
+            progress(report)
+
+    if report.created:
+        # The Product post_save receivers were skipped
+        invalidate('category_tree', 'product_facets')
+    report.elapsed = time.monotonic() - report.started
+    return report
@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from products.models import Product, ProductAttribute
+from techsafar.harness import request_host, warm_up
+
+User = get_user_model()
+
+# Query strings also requested for a route, beyond the bare URL; the hot list
+# filters. {name} placeholders come from sample_values()
+QUERIES = {
+    'api/products/': [
+        '?category={category}',
+        '?category={category}&include_descendants=1',
+        '?spec.{spec}__gte=1',
+        '?spec.pta_approved=true',
+        '?search={word}',
+        '?search={word}&category={category}',
+        '?search={word}&ordering=price',
+        '?category={category}&facets=1',
+    ],
+    'api/products/facets/': ['?category={category}', '?search={word}'],
+}
+
+
+def iter_patterns(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern
+
+
+class Command(BaseCommand):
+    help = 'Fail if any view declaring a query_budget runs more queries than it allows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to authenticate requests as')
+        parser.add_argument(
+            '--kwarg', action='append', default=[], metavar='NAME=VALUE',
+            help='URL kwarg to use for routes such as <product_id> (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        given = dict(item.split('=', 1) for item in options['kwarg'])
+
+        factory = APIRequestFactory(HTTP_HOST=request_host())
+        warm_up(connection)
+        values = self.sample_values()
+        failures = []
+        for route, pattern in iter_patterns(get_resolver().url_patterns):
+            view_class = getattr(pattern.callback, 'view_class', None)
+            budget = getattr(view_class, 'query_budget', None)
+            if budget is None:
+                continue
+
+            kwargs = self.resolve_kwargs(pattern, view_class, given)
+            if kwargs is None:
+                self.stdout.write(f'skip {route} (no value for its URL kwargs)')
+                continue
+
+            path = '/' + route
+            for name, value in kwargs.items():
+                path = path.replace(f'<int:{name}>', str(value))
+            for query in [''] + QUERIES.get(route, []):
+                try:
+                    query = query.format(**values)
+                except KeyError:
+                    self.stdout.write(f'skip {path}{query} (no data for it)')
+                    continue
+                request = factory.get(path + query)
+                if user is not None:
+                    force_authenticate(request, user=user)
+                allowed = budget + sum(
+                    extra for param, extra in getattr(view_class, 'query_budget_params', {}).items()
+                    if param in request.GET
+                )
+
+                # Roll back side effects such as view counters
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as ctx:
+                        response = pattern.callback(request, **kwargs)
+                        response.render()
+                    transaction.set_rollback(True)
+
+                used = len(ctx.captured_queries)
+                status = 'ok' if used <= allowed else 'FAIL'
+                self.stdout.write(f'{status:4} {path}{query} {used}/{allowed} queries ({response.status_code})')
+                if used > allowed:
+                    failures.append(path + query)
+
+        if failures:
+            raise CommandError(f'Query budget exceeded for: {", ".join(failures)}')
+
+    def resolve_kwargs(self, pattern, view_class, given):
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            if name in given:
+                kwargs[name] = int(given[name])
+            elif name == 'pk' and getattr(view_class, 'queryset', None) is not None:
+                pk = view_class.queryset.model._default_manager.values_list('pk', flat=True).first()
+                if pk is None:
+                    return None
+                kwargs[name] = pk
+            else:
+                return None
+        return kwargs
+
+    def sample_values(self):
+        """Values for the QUERIES placeholders, from a product with a category and specs."""
+        values = {}
+        product = Product.objects.exclude(title='').order_by('pk').values('category', 'title').first()
+        if product is not None:
+            values['category'] = product['category']
+            values['word'] = product['title'].split()[0]
+        spec = ProductAttribute.objects.exclude(value_number=None).order_by('pk').values_list('key', flat=True).first()
+        if spec is not None:
+            values['spec'] = spec
+        return values
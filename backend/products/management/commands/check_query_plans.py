@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from chat.models import ChatParticipant
+from products.models import Brand, Product
+from shops.models import Shop
+from techsafar.harness import request_host, warm_up
+from techsafar.plans import explain, main_table
+
+User = get_user_model()
+
+# Requests behind the hot views; {name} placeholders come from sample_values()
+# Filtered lists are covered in their default, price and -views orderings; the
+# rarer filter and ordering pairs (e.g. brand by rating) sort the filtered rows
+SCENARIOS = [
+    '/api/products/',
+    '/api/products/?ordering=price',
+    '/api/products/?ordering=-views',
+    '/api/products/?ordering=-rating',
+    '/api/products/?cursor=',
+    '/api/products/?category={category}',
+    '/api/products/?category={category}&ordering=price',
+    '/api/products/?category={category}&ordering=-views',
+    '/api/products/?brand={brand}',
+    '/api/products/?brand={brand}&ordering=-views',
+    '/api/products/?condition=new',
+    '/api/products/?condition=new&ordering=-views',
+    '/api/products/?is_available=true',
+    '/api/products/?is_available=true&ordering=price',
+    '/api/products/?is_available=true&ordering=-views',
+    '/api/products/?is_negotiable=true',
+    '/api/products/?is_negotiable=true&ordering=-views',
+    '/api/products/featured/',
+    '/api/products/daily-essentials/',
+    '/api/products/brands/featured/',
+    '/api/products/{product}/',
+    '/api/products/{product}/similar/',
+    '/api/products/{product}/reviews/',
+    '/api/shops/',
+    '/api/shops/?ordering=-rating',
+    '/api/shops/{shop}/',
+    '/api/shops/{shop}/reviews/',
+    '/api/chat/rooms/',
+    '/api/chat/rooms/{room}/messages/',
+]
+
+# (table the statement reads from, problem) -> why it is acceptable
+ALLOWED = {
+    ('shops_shopimage', 'sort'): 'images prefetched for a page of shops, ordered across all of them',
+    ('chat_chatroom', 'sort'): "a user's rooms, found through the membership index, ordered by activity",
+    ('users', 'sort'): 'participants prefetched for a page of rooms',
+}
+
+
+class Command(BaseCommand):
+    help = 'Fail if a hot view runs a query that scans a whole table or sorts without an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to authenticate requests as (defaults to a chat participant)')
+
+    def handle(self, *args, **options):
+        values = self.sample_values()
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        else:
+            user = User.objects.filter(pk=values.pop('room_user', None)).first()
+
+        factory = APIRequestFactory(HTTP_HOST=request_host())
+        warm_up(connection)
+        failures = []
+        for scenario in SCENARIOS:
+            try:
+                path = scenario.format(**values)
+            except KeyError:
+                self.stdout.write(f'skip {scenario} (no data for it)')
+                continue
+            statements = self.capture(factory, path, user)
+            problems = []
+            for sql, params in statements:
+                found, plan = explain(connection, sql, params)
+                table = main_table(sql)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'  {sql[:120]}\n    {plan}')
+                for kind, detail in found:
+                    if (table, kind) not in ALLOWED:
+                        problems.append(f'{kind} ({detail}) in: {sql[:160]}')
+            status = 'ok' if not problems else 'FAIL'
+            self.stdout.write(f'{status:4} {path} ({len(statements)} queries)')
+            for problem in problems:
+                self.stdout.write(f'       {problem}')
+            if problems:
+                failures.append(path)
+
+        if failures:
+            raise CommandError(f'Unindexed scans or sorts in: {", ".join(failures)}')
+
+    def sample_values(self):
+        values = {}
+        product = Product.objects.order_by('pk').values('pk', 'category_id').first()
+        if product:
+            values.update(product=product['pk'], category=product['category_id'])
+        brand = Brand.objects.order_by('pk').values_list('pk', flat=True).first()
+        if brand:
+            values['brand'] = brand
+        shop = Shop.objects.order_by('pk').values_list('pk', flat=True).first()
+        if shop:
+            values['shop'] = shop
+        membership = ChatParticipant.objects.order_by('pk').values_list('chat_room_id', 'user_id').first()
+        if membership:
+            values['room'], values['room_user'] = membership
+        return values
+
+    def capture(self, factory, path, user):
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        request = factory.get(path)
+        if user is not None:
+            force_authenticate(request, user=user)
+        match = resolve(path.split('?')[0])
+        # Roll back side effects such as view counters
+        with transaction.atomic():
+            with connection.execute_wrapper(record):
+                response = match.func(request, *match.args, **match.kwargs)
+                response.render()
+            transaction.set_rollback(True)
+        if response.status_code != 200:
+            raise CommandError(f'{path} answered {response.status_code}')
+        return statements
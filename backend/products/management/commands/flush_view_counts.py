@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from products.counters import read_spool, view_counter, write_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered and spooled product view counts to the database'
+
+    def handle(self, *args, **options):
+        total = view_counter.flush()
+
+        path = view_counter.spool_path
+        if path:
+            claimed = path + '.replaying'
+            # A previous run may have died after claiming the spool
+            if not os.path.exists(claimed) and os.path.exists(path):
+                os.replace(path, claimed)
+            if os.path.exists(claimed):
+                counts = read_spool(claimed)
+                write_counts(counts)
+                os.remove(claimed)
+                total += sum(counts.values())
+
+        self.stdout.write(f'Flushed {total} product views')
@@ -0,0 +1,54 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.imports import ImportFormatError, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or NDJSON file ("-" for stdin) into the catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--seller', required=True, help='Username the products are listed under')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without saving them')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            seller = User.objects.get(username=options['seller'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named "{options["seller"]}"')
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+
+        def progress(report):
+            self.stderr.write(f'{report.rows} rows, {report.rows_per_second} rows/s', ending='\r')
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            report = import_products(
+                stream, fmt, seller, batch_size=options['batch_size'],
+                dry_run=options['dry_run'], progress=progress,
+            )
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stderr.write('')
+        for error in report.errors:
+            self.stdout.write(f'line {error["line"]}: {json.dumps(error["errors"])}')
+        if report.failed > len(report.errors):
+            self.stdout.write(f'... {report.failed - len(report.errors)} more errors')
+        verb = 'Validated' if report.dry_run else 'Created'
+        self.stdout.write(
+            f'{verb} {report.created} of {report.rows} rows ({report.failed} failed) '
+            f'in {report.elapsed:.1f}s, {report.rows_per_second} rows/s'
+        )
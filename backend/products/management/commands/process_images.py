@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import ProductImage
+from shops.models import ShopImage
+from techsafar.images import process
+
+
+class Command(BaseCommand):
+    help = 'Render resized variants of product and shop images that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render images that already have variants')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        for model in (ProductImage, ShopImage):
+            queryset = model.objects.order_by('pk')
+            if not options['all']:
+                queryset = queryset.filter(variants={})
+            done = failed = 0
+            for pk in queryset.values_list('pk', flat=True).iterator():
+                if process(model, pk):
+                    done += 1
+                else:
+                    failed += 1
+            self.stdout.write(f'{model.__name__}: {done} processed, {failed} failed')
+        self.stdout.write(f'Finished in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized path and depth of every category'
+
+    def handle(self, *args, **options):
+        categories = {category.pk: category for category in Category.objects.all()}
+        children = {}
+        for category in categories.values():
+            children.setdefault(category.parent_id, []).append(category)
+
+        # Walk from the roots so every parent path is known before its children
+        stack = [(root, '') for root in children.get(None, [])]
+        updated = []
+        while stack:
+            category, parent_path = stack.pop()
+            category.path = parent_path + Category.PATH_SEGMENT.format(category.pk)
+            category.depth = category.path.count('/') - 1
+            updated.append(category)
+            stack.extend((child, category.path) for child in children.get(category.pk, []))
+
+        with transaction.atomic():
+            Category.objects.bulk_update(updated, ['path', 'depth'], batch_size=1000)
+        orphans = len(categories) - len(updated)
+        self.stdout.write(f'Rebuilt paths for {len(updated)} categories')
+        if orphans:
+            self.stderr.write(f'{orphans} categories are part of a parent cycle and were skipped')
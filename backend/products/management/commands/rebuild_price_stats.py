@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import pricing
+
+
+class Command(BaseCommand):
+    help = 'Recount the market price statistics from every available product'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = pricing.rebuild()
+        self.stdout.write(f'Computed {count} market price groups in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = get_search_backend().rebuild(Product.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(f'Indexed {count} products in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.similarity import similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "similar products" vectors and save them for workers to load'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = similarity_index.build(save=True, reset_journal=True)
+        self.stdout.write(f'Indexed {count} products in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.specs import sync_attributes
+
+
+class Command(BaseCommand):
+    help = 'Extract indexed specification attributes for every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        products = Product.objects.only('id', 'specifications').order_by('pk').iterator(chunk_size=batch_size)
+        batch = []
+        total_products = total_attributes = 0
+        for product in products:
+            batch.append(product)
+            if len(batch) >= batch_size:
+                total_attributes += sync_attributes(batch)
+                total_products += len(batch)
+                batch = []
+        if batch:
+            total_attributes += sync_attributes(batch)
+            total_products += len(batch)
+        self.stdout.write(
+            f'Extracted {total_attributes} attributes from {total_products} products '
+            f'in {time.monotonic() - started:.1f}s'
+        )
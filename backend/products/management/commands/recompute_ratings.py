@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from products.models import Product, Review
+from shops.models import Shop, ShopReview
+from techsafar.ratings import recompute_ratings
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating aggregates of products, shops and sellers from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        targets = (
+            ('products', Product, Review.objects.all(), 'product'),
+            ('sellers', User, Review.objects.all(), 'product__seller'),
+            ('shops', Shop, ShopReview.objects.all(), 'shop'),
+        )
+        for label, model, reviews, field in targets:
+            rated = recompute_ratings(model, reviews, field, batch_size=batch_size)
+            self.stdout.write(f'Recomputed ratings for {rated} {label}')
@@ -0,0 +1,65 @@
+import json
+import platform
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from techsafar.benchmark import TOLERANCE, BenchmarkRunner, compare
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main API endpoints and the chat WebSocket in-process and report JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--scenario', action='append', help='Only run this scenario (repeatable)')
+        parser.add_argument('--output', help='Write the results to this file instead of stdout')
+        parser.add_argument('--compare', metavar='BASELINE', help='Fail on regressions against an earlier output')
+        parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                            help='Allowed relative latency increase for --compare')
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on; latencies include its query logging')
+        runner = BenchmarkRunner(requests=options['requests'], warmup=options['warmup'], seed=options['seed'])
+        results = {
+            'revision': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+            },
+            'requests': options['requests'],
+            'scenarios': runner.run(only=options['scenario']),
+        }
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as handle:
+                baseline = json.load(handle)
+            regressions = compare(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stderr.write(f'No regressions against {options["compare"]}')
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import pricing
+from products.similarity import similarity_index
+from techsafar.dataset import PASSWORD, MarketplaceGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a seeded synthetic marketplace for run_benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--rooms', type=int, help='Chat rooms; defaults to one per 1000 products')
+        parser.add_argument('--messages-per-room', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            generator = MarketplaceGenerator(
+                options['products'], seed=options['seed'], rooms=options['rooms'],
+                messages_per_room=options['messages_per_room'],
+                progress=lambda message: self.stderr.write(message),
+            )
+            counts = generator.generate()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        # The products were bulk inserted, without the signals that queue them
+        self.stderr.write('Building the similarity index')
+        similarity_index.build(save=True, reset_journal=True)
+        self.stderr.write('Computing market prices')
+        pricing.rebuild()
+        self.stdout.write(json.dumps(counts, indent=2))
+        self.stdout.write(f'Users are named bench{options["seed"]}-<type>-<n>, password "{PASSWORD}"')
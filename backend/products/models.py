@@ -1,12 +1,21 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, JSONObject, Lower, Substr, Trim
 from django.conf import settings
+from techsafar.ratings import RatingAggregate
 
 class Category(models.Model):
+    PATH_SEGMENT = '{:08d}/'
+
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
     created_at = models.DateTimeField(auto_now_add=True)
     icon = models.ImageField(upload_to='category_icons/', blank=True, null=True)  # For category icons
+    # Materialized path of ids from the root, e.g. "00000001/00000007/"
+    path = models.CharField(max_length=255, db_index=True, editable=False, blank=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -15,6 +24,60 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def subtree_lookup(path, prefix=''):
+        # Range on the path index; '0' sorts right after '/'
+        return {f'{prefix}path__gte': path, f'{prefix}path__lt': path[:-1] + '0'}
+
+    def get_descendants(self, include_self=True):
+        queryset = Category.objects.filter(**self.subtree_lookup(self.path))
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    def parent_path(self):
+        # Read from the database; a cached parent instance may have moved since
+        if not self.parent_id:
+            return ''
+        return Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+
+    def clean(self):
+        if self.path and self.parent_path().startswith(self.path):
+            raise ValidationError({'parent': 'A category cannot be moved under itself or its descendants.'})
+
+    def save(self, *args, **kwargs):
+        old_path, old_depth = self.path, self.depth
+        adding = self._state.adding
+        with transaction.atomic():
+            parent_path = self.parent_path()
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError('A category cannot be moved under itself or its descendants')
+            # With a known id the path is written with the row; new rows need a follow-up update
+            if self.pk is not None:
+                self.set_path(parent_path)
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None and self.path != old_path:
+                    kwargs['update_fields'] = {*update_fields, 'path', 'depth'}
+            try:
+                super().save(*args, **kwargs)
+            except BaseException:
+                # Keep the old path, so a retry still re-roots the subtree
+                self.path, self.depth = old_path, old_depth
+                raise
+            if not self.path.endswith(self.PATH_SEGMENT.format(self.pk)):
+                self.set_path(parent_path)
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            if old_path and not adding and self.path != old_path:
+                # Re-root the whole subtree in one statement
+                Category.objects.filter(**self.subtree_lookup(old_path)).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_depth),
+                )
+
+    def set_path(self, parent_path):
+        self.path = parent_path + self.PATH_SEGMENT.format(self.pk)
+        self.depth = self.path.count('/') - 1
+
 class Brand(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
@@ -25,11 +88,78 @@ class Brand(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name'], condition=Q(is_featured=True), name='brand_featured_idx')]
 
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+class ProductQuerySet(models.QuerySet):
+    # Serializer fields that need each relation/column
+    LISTING_RELATIONS = {
+        'seller': ('seller_name',),
+        'category': ('category_name',),
+        'brand': ('brand_name', 'brand_logo'),
+    }
+    DEFERRABLE_COLUMNS = ('description', 'specifications')
+
+    def with_primary_image(self):
+        primary = ProductImage.objects.filter(product=OuterRef('pk')).order_by('-is_primary', 'created_at')
+        return self.annotate(
+            primary_image_path=Subquery(primary.values('image')[:1]),
+            primary_image_variants=Subquery(primary.values('variants')[:1], output_field=models.JSONField()),
+        )
+
+    def with_market_price(self):
+        """
+        Annotate ``market_stats``: the MarketPrice summary of the most
+        specific group with enough listings, read in the same query.
+        """
+        from .pricing import CONFIG as PRICING
+
+        def group(level, **lookups):
+            stats = MarketPrice.objects.filter(
+                category=OuterRef('category'), condition=OuterRef('condition'), level=level,
+                count__gte=PRICING['MIN_LISTINGS'], **lookups,
+            ).values(data=JSONObject(level='level', count='count', p10='p10', p50='p50', p90='p90',
+                                     average_discount='average_discount'))
+            return Subquery(stats[:1], output_field=models.JSONField())
+
+        return self.annotate(market_stats=Coalesce(
+            group(MarketPrice.MODEL, brand=OuterRef('brand'), model=Lower(Trim(OuterRef('model')))),
+            group(MarketPrice.BRAND, brand=OuterRef('brand')),
+            group(MarketPrice.CATEGORY),
+            output_field=models.JSONField(),
+        ))
+
+    def for_listing(self, fields=None):
+        """
+        Load what a product serializer renders in a fixed number of queries.
+        ``fields`` (see techsafar.fieldsets.requested_fields) limits the joins,
+        prefetches and large columns to the ones actually rendered.
+        """
+        def wanted(*names):
+            return fields is None or any(name in fields for name in names)
+
+        queryset = self
+        related = [name for name, needs in self.LISTING_RELATIONS.items() if wanted(*needs)]
+        if related:
+            queryset = queryset.select_related(*related)
+        if wanted('images'):
+            queryset = queryset.prefetch_related('images')
+        if wanted('reviews'):
+            queryset = queryset.prefetch_related(
+                Prefetch('reviews', queryset=Review.objects.select_related('reviewer'))
+            )
+        if fields is not None and 'primary_image' in fields:
+            queryset = queryset.with_primary_image()
+        if fields is not None and 'market_price' in fields:
+            queryset = queryset.with_market_price()
+        deferred = [name for name in self.DEFERRABLE_COLUMNS if not wanted(name)]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+class Product(RatingAggregate):
     CONDITION_CHOICES = (
         ('new', 'New'),
         ('like_new', 'Like New'),
@@ -58,27 +188,65 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # (key, id) pairs back the keyset pagination orderings
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['views', 'id'], name='product_views_idx'),
+            models.Index(fields=['rating', 'id'], name='product_rating_idx'),
+            # Filter column first, then the ordering, so filtered lists need no sort
+            models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='product_category_price_idx'),
+            models.Index(fields=['category', 'views', 'id'], name='product_category_views_idx'),
+            models.Index(fields=['brand', 'created_at', 'id'], name='product_brand_created_idx'),
+            models.Index(fields=['brand', 'views', 'id'], name='product_brand_views_idx'),
+            models.Index(fields=['condition', 'created_at', 'id'], name='product_condition_created_idx'),
+            models.Index(fields=['condition', 'views', 'id'], name='product_condition_views_idx'),
+            # Partial indexes hold only the rows these lists read
+            models.Index(fields=['created_at', 'id'], condition=Q(is_available=True),
+                         name='product_available_created_idx'),
+            models.Index(fields=['price', 'id'], condition=Q(is_available=True), name='product_available_price_idx'),
+            models.Index(fields=['views', 'id'], condition=Q(is_available=True), name='product_available_views_idx'),
+            models.Index(fields=['created_at', 'id', 'updated_at', 'total_ratings', 'rating_sum'],
+                         condition=Q(is_negotiable=True), name='product_negotiable_created_idx'),
+            models.Index(fields=['views', 'id'], condition=Q(is_negotiable=True), name='product_negotiable_views_idx'),
+            models.Index(fields=['created_at', 'id', 'updated_at', 'total_ratings', 'rating_sum'],
+                         condition=Q(is_featured=True), name='product_featured_idx'),
+            models.Index(fields=['created_at', 'id', 'updated_at', 'total_ratings', 'rating_sum'],
+                         condition=Q(is_daily_essential=True), name='product_daily_essential_idx'),
+            # Covers the list ETag aggregates (count, Max(updated_at), rating sums)
+            models.Index(fields=['updated_at', 'total_ratings', 'rating_sum'], name='product_validators_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.price}"
     
-    def save(self, *args, **kwargs):
+    def update_discount(self):
         # Calculate discount percentage if original price is provided
         if self.original_price and self.original_price > self.price:
             self.discount_percentage = int(((self.original_price - self.price) / self.original_price) * 100)
+
+    def save(self, *args, **kwargs):
+        self.update_discount()
         super().save(*args, **kwargs)
 
 # Keep existing ProductImage and Review models unchanged
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
+    # Resized copies by name, filled in by techsafar.images
+    variants = models.JSONField(default=dict, blank=True)
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-is_primary', 'created_at']
+        # The primary image lookup of every listed product
+        indexes = [models.Index(fields=['product', '-is_primary', 'created_at'], name='productimage_primary_idx')]
 
     def __str__(self):
         return f"Image for {self.product.title}"
@@ -94,6 +262,76 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['product', 'reviewer']
+        indexes = [models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx')]
+
+    def __str__(self):
+        return f"Review by {self.reviewer.username} for {self.product.title}"
+
+class ProductAttribute(models.Model):
+    """
+    One typed, indexed row per ``Product.specifications`` entry, extracted on
+    save (see products.specs) so spec filters are index lookups.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attributes')
+    key = models.CharField(max_length=64)
+    value_text = models.CharField(max_length=255)
+    value_number = models.FloatField(null=True, blank=True)  # In the canonical unit
+    unit = models.CharField(max_length=8, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value_number', 'product'], name='attribute_number_idx'),
+            models.Index(fields=['key', 'value_text', 'product'], name='attribute_text_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key}={self.value_text} for product {self.product_id}"
+
+class MarketPrice(models.Model):
+    """
+    Price statistics of the available listings in one group, kept up to date
+    by products.pricing. Groups nest: a brand and model within a category
+    and condition, the brand alone, and the whole category.
+    """
+    MODEL, BRAND, CATEGORY = 0, 1, 2
+    LEVEL_CHOICES = (
+        (MODEL, 'Model'),
+        (BRAND, 'Brand'),
+        (CATEGORY, 'Category'),
+    )
+
+    key = models.CharField(max_length=160, unique=True)
+    level = models.PositiveSmallIntegerField(choices=LEVEL_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='market_prices')
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, null=True, blank=True, related_name='market_prices')
+    model = models.CharField(max_length=100, blank=True)  # Lowercased
+    condition = models.CharField(max_length=10, choices=Product.CONDITION_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    p10 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    p50 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    p90 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount_total = models.BigIntegerField(default=0)
+    average_discount = models.FloatField(default=0)
+    # Listings per log-spaced price bucket, {bucket: count}
+    histogram = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'condition', 'level', 'brand', 'model'], name='market_price_group_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {self.p50} ({self.count} listings)"
+
+class ListDeletion(models.Model):
+    """
+    When a row of ``label``'s model (e.g. "products.product") was last
+    deleted. A delete changes no updated_at, so list views read this for
+    their Last-Modified; see techsafar.conditional.
+    """
+    label = models.CharField(max_length=100, unique=True)
+    deleted_at = models.DateTimeField()
 
     def __str__(self):
-        return f"Review by {self.reviewer.username} for {self.product.title}"
\ No newline at end of file
+        return f"{self.label} deleted at {self.deleted_at}"
@@ -11,4 +11,13 @@ class IsSellerOrReadOnly(permissions.BasePermission):
             return True
 
         # Write permissions are only allowed to the seller of the product
-        return obj.seller == request.user 
\ No newline at end of file
+        return obj.seller == request.user 
+
+class IsSellerAccount(permissions.BasePermission):
+    """
+    Only seller and shop accounts may list products in bulk or price listings.
+    """
+    message = 'Only seller and shop accounts can import or price products.'
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.user_type in ('seller', 'shop')
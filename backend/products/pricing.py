@@ -0,0 +1,231 @@
+"""
+Market prices: percentiles, counts and average discount of the available
+listings per (category, brand, model, condition), stored in MarketPrice.
+
+Each group counts its listings in log-spaced price buckets ``RESOLUTION``
+apart, so a listing is added or removed by changing one bucket, without
+reading the other listings, and the percentiles read off the histogram
+are within ``RESOLUTION / 2`` of the exact ones. Product signals apply the
+changes as products are saved and deleted; bulk writes that skip them
+(imports, seeding) call ``add_products`` or ``rebuild``. Run
+``manage.py rebuild_price_stats`` periodically to drop any drift.
+"""
+
+import math
+from collections import defaultdict
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from techsafar.bulk import bulk_insert, bulk_update
+from .models import MarketPrice, Product
+
+CONFIG = {
+    'RESOLUTION': 0.02,
+    'MIN_LISTINGS': 5,
+    **getattr(settings, 'PRICE_STATS', {}),
+}
+
+# Product fields a listing's groups and price depend on
+PRICE_FIELDS = ('category_id', 'brand_id', 'model', 'condition', 'price', 'discount_percentage', 'is_available')
+LEVEL_NAMES = dict((level, name.lower()) for level, name in MarketPrice.LEVEL_CHOICES)
+PERCENTILES = (('p10', 0.1), ('p50', 0.5), ('p90', 0.9))
+GROUP_FIELDS = ['key', 'level', 'category_id', 'brand_id', 'model', 'condition']
+STATS_FIELDS = ['count', 'p10', 'p50', 'p90', 'discount_total', 'average_discount', 'histogram', 'updated_at']
+CENT = Decimal('0.01')
+BATCH_SIZE = 5000
+
+
+def price_bucket(price):
+    return math.floor(math.log(max(float(price), 0.01)) / math.log1p(CONFIG['RESOLUTION']))
+
+
+def bucket_price(bucket):
+    # Geometric middle of the bucket
+    return Decimal(math.pow(1 + CONFIG['RESOLUTION'], bucket + 0.5)).quantize(CENT)
+
+
+def normalize_model(model):
+    return (model or '').strip().lower()
+
+
+def groups(category_id, brand_id, model, condition):
+    """(key, level, fields) of each group a listing belongs to, most specific first."""
+    model = normalize_model(model)
+    result = []
+    if brand_id is not None:
+        if model:
+            result.append((f'{category_id}:{brand_id}:{model}:{condition}', MarketPrice.MODEL,
+                           {'brand_id': brand_id, 'model': model}))
+        result.append((f'{category_id}:{brand_id}::{condition}', MarketPrice.BRAND, {'brand_id': brand_id}))
+    result.append((f'{category_id}:::{condition}', MarketPrice.CATEGORY, {}))
+    return [(key, level, {'category_id': category_id, 'condition': condition, **fields})
+            for key, level, fields in result]
+
+
+class Changes:
+    """Pending per-group changes, netted so an unchanged listing writes nothing."""
+
+    def __init__(self):
+        self.groups = {}
+        self.buckets = defaultdict(lambda: defaultdict(int))
+        self.counts = defaultdict(int)
+        self.discounts = defaultdict(int)
+
+    def add(self, values, sign=1):
+        if not values or not values['is_available']:
+            return
+        bucket = price_bucket(values['price'])
+        for key, level, fields in groups(values['category_id'], values['brand_id'],
+                                         values['model'], values['condition']):
+            self.groups[key] = (level, fields)
+            self.buckets[key][bucket] += sign
+            self.counts[key] += sign
+            self.discounts[key] += sign * (values['discount_percentage'] or 0)
+
+    def remove(self, values):
+        self.add(values, sign=-1)
+
+    def changed_keys(self):
+        return sorted(
+            key for key in self.groups
+            if self.counts[key] or self.discounts[key] or any(self.buckets[key].values())
+        )
+
+
+def update_stats(stats):
+    """Recompute the derived columns of a MarketPrice from its histogram."""
+    stats.histogram = {bucket: count for bucket, count in stats.histogram.items() if count > 0}
+    buckets = sorted((int(bucket), count) for bucket, count in stats.histogram.items())
+    stats.count = sum(count for _, count in buckets)
+    stats.average_discount = round(stats.discount_total / stats.count, 2) if stats.count else 0
+    for name, fraction in PERCENTILES:
+        rank, seen = fraction * (stats.count - 1), 0
+        value = Decimal(0)
+        for bucket, count in buckets:
+            seen += count
+            if seen > rank:
+                value = bucket_price(bucket)
+                break
+        setattr(stats, name, value)
+
+
+def apply(changes):
+    keys = changes.changed_keys()
+    if not keys:
+        return
+    now = timezone.now()
+    created, updated, emptied = [], [], []
+    with transaction.atomic():
+        # Locked in key order, so concurrent saves cannot deadlock
+        existing = {stats.key: stats for stats in MarketPrice.objects.select_for_update().filter(key__in=keys)}
+        for key in keys:
+            stats = existing.get(key)
+            if stats is None:
+                level, fields = changes.groups[key]
+                stats = MarketPrice(key=key, level=level, **fields)
+            for bucket, delta in changes.buckets[key].items():
+                stats.histogram[str(bucket)] = stats.histogram.get(str(bucket), 0) + delta
+            stats.discount_total += changes.discounts[key]
+            stats.updated_at = now
+            update_stats(stats)
+            if not stats.count:
+                if stats.pk:
+                    emptied.append(stats.pk)
+            elif stats.pk:
+                updated.append([getattr(stats, field) for field in STATS_FIELDS] + [stats.pk])
+            else:
+                created.append([getattr(stats, field) for field in GROUP_FIELDS + STATS_FIELDS])
+        # Plain executemany; a save() per group dominated bulk imports
+        for start in range(0, len(keys), BATCH_SIZE):
+            bulk_insert(MarketPrice, GROUP_FIELDS + STATS_FIELDS, created[start:start + BATCH_SIZE])
+            bulk_update(MarketPrice, STATS_FIELDS, updated[start:start + BATCH_SIZE])
+        if emptied:
+            MarketPrice.objects.filter(pk__in=emptied).delete()
+
+
+def record_change(old, new):
+    """Move a listing from its ``old`` values (None if new) to ``new`` (None if deleted)."""
+    changes = Changes()
+    changes.remove(old)
+    changes.add(new)
+    apply(changes)
+
+
+def add_products(products):
+    """Count products written without their post_save signal (bulk_create)."""
+    changes = Changes()
+    for product in products:
+        changes.add({field: getattr(product, field) for field in PRICE_FIELDS})
+    apply(changes)
+
+
+def rebuild():
+    """Recount every group from the products; returns the number of groups."""
+    changes = Changes()
+    rows = Product.objects.filter(is_available=True).order_by().values(*PRICE_FIELDS)
+    for values in rows.iterator(chunk_size=BATCH_SIZE):
+        changes.add(values)
+    fields = GROUP_FIELDS + STATS_FIELDS
+    now = timezone.now()
+    with transaction.atomic():
+        MarketPrice.objects.all().delete()
+        batch = []
+        for key in changes.changed_keys():
+            level, group_fields = changes.groups[key]
+            # Plain attributes; model instances are costly to create by the million
+            stats = SimpleNamespace(**{
+                'brand_id': None, 'model': '', **group_fields,
+                'key': key, 'level': level, 'discount_total': changes.discounts[key], 'updated_at': now,
+                'histogram': {str(bucket): count for bucket, count in changes.buckets[key].items()},
+            })
+            update_stats(stats)
+            batch.append([getattr(stats, field) for field in fields])
+            if len(batch) >= BATCH_SIZE:
+                bulk_insert(MarketPrice, fields, batch)
+                batch = []
+        bulk_insert(MarketPrice, fields, batch)
+    return len(changes.groups)
+
+
+def market_stats(category_id, brand_id, model, condition):
+    """MarketPrice of each group the listing would belong to, most specific first, in one query."""
+    candidates = groups(category_id, brand_id, model, condition)
+    found = {stats.key: stats for stats in MarketPrice.objects.filter(key__in=[key for key, _, _ in candidates])}
+    return [found[key] for key, _, _ in candidates if key in found]
+
+
+def summary(stats):
+    """The public fields of a MarketPrice, or of the dict annotated by ProductQuerySet.with_market_price()."""
+    if stats is None:
+        return None
+    if isinstance(stats, MarketPrice):
+        stats = {name: getattr(stats, name) for name in ('level', 'count', 'p10', 'p50', 'p90', 'average_discount')}
+    return {
+        'level': LEVEL_NAMES[stats['level']],
+        'listings': stats['count'],
+        **{name: str(Decimal(str(stats[name])).quantize(CENT)) for name, _ in PERCENTILES},
+        'average_discount': stats['average_discount'],
+    }
+
+
+def price_position(price, stats):
+    """
+    How ``price`` compares with the group: ``low`` below its 10th
+    percentile, ``high`` above its 90th, ``fair`` in between, with the
+    difference from the median in percent. Percentiles are only known to
+    their bucket, so prices are compared by bucket: a price in the same
+    bucket as a percentile counts as equal to it.
+    """
+    if stats is None:
+        return None
+    price, p10, p50, p90 = (Decimal(str(value)) for value in (price, stats['p10'], stats['p50'], stats['p90']))
+    if not p50:
+        return None
+    bucket, low, median, high = (price_bucket(value) for value in (price, p10, p50, p90))
+    position = 'low' if bucket < low else 'high' if bucket > high else 'fair'
+    difference = 0 if bucket == median else int(round((price - p50) / p50 * 100))
+    return {'position': position, 'difference_percentage': difference}
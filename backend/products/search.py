@@ -0,0 +1,196 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def spec_text(value):
+    # Flatten specifications JSON into "key value" words
+    if isinstance(value, dict):
+        return ' '.join(f'{key} {spec_text(item)}' for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(spec_text(item) for item in value)
+    if value is None:
+        return ''
+    return str(value)
+
+
+def product_document(product):
+    return {
+        'title': product.title,
+        'description': product.description,
+        'brand': product.brand.name if product.brand_id else '',
+        'model': product.model,
+        'specs': spec_text(product.specifications),
+    }
+
+
+class SearchBackend:
+    """
+    Interface for product search backends.
+
+    ``search`` narrows a Product queryset to the matches for ``query`` and,
+    when the caller has not asked for another ordering, ranks them by
+    relevance.
+    """
+
+    def index(self, product):
+        raise NotImplementedError
+
+    def index_many(self, products):
+        for product in products:
+            self.index(product)
+
+    def remove(self, product_id):
+        raise NotImplementedError
+
+    def rebuild(self, products, batch_size=1000):
+        raise NotImplementedError
+
+    def search(self, queryset, query, rank=True):
+        raise NotImplementedError
+
+
+class DatabaseBackend(SearchBackend):
+    """
+    Fallback that keeps the previous ``icontains`` behaviour. Needs no index.
+    """
+    fields = ('title', 'description', 'brand__name', 'model')
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+    def rebuild(self, products, batch_size=1000):
+        return 0
+
+    def search(self, queryset, query, rank=True):
+        for term in TOKEN_RE.findall(query):
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Ranked full-text search on an SQLite FTS5 table keyed by product id.
+    """
+    table = 'products_search'
+    columns = ('title', 'description', 'brand', 'model', 'specs')
+    # bm25() column weights, in the order of ``columns``
+    weights = (10.0, 1.0, 5.0, 5.0, 2.0)
+
+    def __init__(self):
+        self._ready = False
+
+    def ensure_table(self, cursor):
+        if not self._ready:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                f"{', '.join(self.columns)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+            self._ready = True
+
+    def _rows(self, products):
+        for product in products:
+            document = product_document(product)
+            yield [product.pk] + [document[column] for column in self.columns]
+
+    def _insert(self, cursor, rows):
+        placeholders = ', '.join(['%s'] * (len(self.columns) + 1))
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) VALUES ({placeholders})",
+            rows
+        )
+
+    def index(self, product):
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            self._insert(cursor, list(self._rows([product])))
+
+    def index_many(self, products):
+        rows = list(self._rows(products))
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [row[:1] for row in rows])
+            self._insert(cursor, rows)
+
+    def remove(self, product_id):
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self, products, batch_size=1000):
+        count = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.execute(f"DELETE FROM {self.table}")
+            batch = []
+            for row in self._rows(products.select_related('brand').iterator(chunk_size=batch_size)):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._insert(cursor, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._insert(cursor, batch)
+                count += len(batch)
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return count
+
+    def match_expression(self, query):
+        # Quote each token so user input can't inject FTS syntax; prefix-match the last one
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, queryset, query, rank=True):
+        """
+        Every match is kept, so other filters, orderings and counts see the
+        whole set. Ranked by joining the FTS table for its bm25 score
+        (``search_rank``), newest first on ties.
+        """
+        expression = self.match_expression(query)
+        if expression is None:
+            return queryset.none()
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+        if not rank:
+            return queryset.filter(pk__in=RawSQL(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [expression]
+            ))
+        # A join on a virtual table has no ORM spelling; bm25() needs the MATCH row
+        weights = ', '.join(str(weight) for weight in self.weights)
+        product_table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[self.table],
+            where=[f"{self.table}.rowid = {product_table}.id", f"{self.table} MATCH %s"],
+            params=[expression],
+            select={'search_rank': f"bm25({self.table}, {weights})"},
+            order_by=['search_rank', '-created_at', '-id'],
+        )
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        config = getattr(settings, 'PRODUCT_SEARCH', {})
+        backend_class = import_string(config.get('BACKEND', 'products.search.DatabaseBackend'))
+        _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
@@ -1,20 +1,60 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from techsafar.fieldsets import SparseFieldsetMixin
+from techsafar.images import schedule, strip_metadata, variant_urls
 from .models import Category, Brand, Product, ProductImage, Review
+from .pricing import price_position, summary
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
+class CategoryTreeListSerializer(serializers.ListSerializer):
+    """
+    Nests a path-ordered, flat list of categories into a tree and rolls
+    product counts up to every ancestor.
+    """
+    def to_representation(self, data):
+        nodes = {}
+        roots = []
+        categories = list(data)
+        for category in categories:
+            node = self.child.to_representation(category)
+            node['total_product_count'] = node['product_count']
+            node['children'] = []
+            nodes[category.pk] = node
+            parent = nodes.get(category.parent_id)
+            (parent['children'] if parent else roots).append(node)
+        # Deepest first, so each node's total is final before it is added to its parent
+        for category in sorted(categories, key=lambda c: c.depth, reverse=True):
+            parent = nodes.get(category.parent_id)
+            if parent:
+                parent['total_product_count'] += nodes[category.pk]['total_product_count']
+        return roots
+
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'slug', 'icon', 'depth', 'product_count')
+        list_serializer_class = CategoryTreeListSerializer
+
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
         model = Brand
         fields = '__all__'
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'is_primary')
+        fields = ('id', 'image', 'variants', 'is_primary')
+
+    def get_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
 
 class ReviewSerializer(serializers.ModelSerializer):
     reviewer_name = serializers.CharField(source='reviewer.username', read_only=True)
@@ -24,15 +64,17 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ('id', 'reviewer', 'reviewer_name', 'rating', 'comment', 'created_at', 'updated_at')
         read_only_fields = ('reviewer',)
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     seller_name = serializers.CharField(source='seller.username', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     brand_logo = serializers.ImageField(source='brand.logo', read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(source='rating', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     discount_percentage = serializers.IntegerField(read_only=True)
+    market_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -41,14 +83,54 @@ class ProductSerializer(serializers.ModelSerializer):
                  'price', 'original_price', 'discount_percentage', 'condition', 
                  'model', 'specifications', 'location', 'is_negotiable', 
                  'is_available', 'is_featured', 'is_daily_essential',
-                 'views', 'images', 'reviews', 'average_rating', 'created_at', 'updated_at')
-        read_only_fields = ('seller', 'views', 'discount_percentage')
+                 'views', 'images', 'reviews', 'average_rating', 'total_ratings',
+                 'rating_histogram', 'market_price', 'created_at', 'updated_at')
+        read_only_fields = ('seller', 'views', 'discount_percentage', 'total_ratings')
+        # Also served by /reviews/; only sent with ?expand=reviews
+        expandable_fields = ('reviews',)
+
+    def get_market_price(self, obj):
+        # Annotated by ProductQuerySet.with_market_price(); see products.pricing
+        market = summary(getattr(obj, 'market_stats', None))
+        if market is None:
+            return None
+        return {**market, **(price_position(obj.price, market) or {})}
 
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if not reviews:
-            return 0
-        return sum(review.rating for review in reviews) / len(reviews)
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Compact card representation for list endpoints. Heavier fields are
+    available through ?expand=.
+    """
+    seller_name = serializers.CharField(source='seller.username', read_only=True)
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    brand_name = serializers.CharField(source='brand.name', read_only=True)
+    primary_image = serializers.SerializerMethodField()
+    images = ProductImageSerializer(many=True, read_only=True)
+    average_rating = serializers.FloatField(source='rating', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'title', 'price', 'original_price', 'discount_percentage',
+                 'primary_image', 'average_rating', 'total_ratings', 'location',
+                 'description', 'condition', 'specifications', 'seller_name',
+                 'category_name', 'brand_name', 'images', 'created_at')
+        expandable_fields = ('description', 'condition', 'specifications', 'seller_name',
+                             'category_name', 'brand_name', 'images', 'created_at')
+
+    def get_primary_image(self, obj):
+        # Annotated by ProductQuerySet.with_primary_image(); the card-sized
+        # variant once it has been rendered, the original upload until then
+        if hasattr(obj, 'primary_image_path'):
+            path, variants = obj.primary_image_path, obj.primary_image_variants
+        else:
+            image = next(iter(obj.images.all()), None)
+            path, variants = (image.image.name, image.variants) if image else (None, None)
+        path = (variants or {}).get('card') or path
+        if not path:
+            return None
+        url = default_storage.url(path)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 class ProductCreateSerializer(serializers.ModelSerializer):
     images = serializers.ListField(
@@ -66,12 +148,62 @@ class ProductCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         images = validated_data.pop('images', [])
         product = Product.objects.create(**validated_data)
-        
-        for i, image in enumerate(images):
-            ProductImage.objects.create(
+
+        created = ProductImage.objects.bulk_create([
+            ProductImage(
                 product=product,
-                image=image,
+                image=strip_metadata(image),
                 is_primary=(i == 0)  # First image is primary
             )
-        
-        return product
\ No newline at end of file
+            for i, image in enumerate(images)
+        ])
+        # Variants are rendered in the background
+        schedule(ProductImage, [image.pk for image in created])
+
+        return product
+
+
+class ProductImportRowSerializer(serializers.ModelSerializer):
+    """
+    One row of a bulk import. Category and brand are given by slug and
+    resolved through the ``categories``/``brands`` dicts in the context, so
+    validating a row never queries the database.
+    """
+    category = serializers.SlugField()
+    brand = serializers.SlugField(required=False, allow_null=True)
+    specifications = serializers.JSONField(required=False, default=dict)
+
+    class Meta:
+        model = Product
+        fields = ('category', 'brand', 'title', 'description', 'price', 'original_price',
+                 'condition', 'model', 'specifications', 'location', 'is_negotiable', 'is_available')
+        # Validation must not hit the database for every row
+        validators = []
+
+    def validate_category(self, value):
+        try:
+            return self.context['categories'][value]
+        except KeyError:
+            raise serializers.ValidationError(f'Unknown category "{value}".')
+
+    def validate_brand(self, value):
+        if not value:
+            return None
+        try:
+            return self.context['brands'][value]
+        except KeyError:
+            raise serializers.ValidationError(f'Unknown brand "{value}".')
+
+    def validate_specifications(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Expected a JSON object.')
+        return value
+
+
+class PriceCheckSerializer(serializers.Serializer):
+    """Query parameters of the seller price check; ids are not looked up."""
+    category = serializers.IntegerField()
+    brand = serializers.IntegerField(required=False, allow_null=True)
+    model = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    condition = serializers.ChoiceField(choices=Product.CONDITION_CHOICES)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
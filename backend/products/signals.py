@@ -0,0 +1,216 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from techsafar.cache import invalidate
+from techsafar.conditional import record_deletion
+from techsafar.images import delete_variants
+from techsafar.ratings import apply_rating_change
+from .models import Brand, Category, Product, ProductImage, Review
+from .pricing import PRICE_FIELDS, record_change
+from .search import get_search_backend
+from .similarity import similarity_index
+from .specs import sync_attributes
+
+User = get_user_model()
+
+PRODUCT_LIST_NAMESPACES = ('featured_products', 'daily_essentials')
+
+
+def invalidate_product_lists(is_featured, is_daily_essential):
+    namespaces = []
+    if is_featured:
+        namespaces.append('featured_products')
+    if is_daily_essential:
+        namespaces.append('daily_essentials')
+    invalidate(*namespaces)
+
+
+def update_product_ratings(review, old, new):
+    apply_rating_change(Product, review.product_id, old, new)
+    row = (Product.objects.filter(pk=review.product_id)
+           .values_list('seller_id', 'is_featured', 'is_daily_essential').first())
+    if row is None:
+        return
+    seller_id, is_featured, is_daily_essential = row
+    apply_rating_change(User, seller_id, old, new)
+    # Cached lists show the rating
+    invalidate_product_lists(is_featured, is_daily_essential)
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._saved_rating = instance.rating if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    update_product_ratings(instance, None if created else instance._saved_rating, instance.rating)
+    instance._saved_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    update_product_ratings(instance, instance._saved_rating, None)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # Lists' Last-Modified; see techsafar.conditional
+    record_deletion(Product)
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_products(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    backend = get_search_backend()
+    for product in instance.products.select_related('brand').iterator():
+        backend.index(product)
+
+
+def mark_similarity_changed(product_ids):
+    # After commit, so other workers reload the committed rows
+    transaction.on_commit(lambda: similarity_index.mark_changed(product_ids), robust=True)
+
+
+@receiver(post_save, sender=Product)
+def product_saved_similarity(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_similarity_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_similarity(sender, instance, **kwargs):
+    mark_similarity_changed([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved_similarity(sender, instance, created, raw=False, **kwargs):
+    # The brand name is part of each product's text
+    if not (created or raw):
+        mark_similarity_changed(list(instance.products.values_list('pk', flat=True)))
+
+
+@receiver(post_init, sender=Product)
+def remember_product_flags(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not loaded one query at a time
+    instance._saved_flags = (
+        instance.__dict__.get('is_featured', False),
+        instance.__dict__.get('is_daily_essential', False),
+        instance.__dict__.get('category_id'),
+    )
+
+
+@receiver(post_save, sender=Product)
+def product_saved_cache(sender, instance, created, **kwargs):
+    was_featured, was_daily_essential, old_category_id = instance._saved_flags
+    invalidate_product_lists(
+        was_featured or instance.is_featured,
+        was_daily_essential or instance.is_daily_essential,
+    )
+    # The category tree carries product counts
+    if created or old_category_id != instance.category_id:
+        invalidate('category_tree')
+    invalidate('product_facets')
+    remember_product_flags(sender, instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_cache(sender, instance, **kwargs):
+    invalidate_product_lists(instance.is_featured, instance.is_daily_essential)
+    invalidate('category_tree', 'product_facets')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed_cache(sender, **kwargs):
+    invalidate('categories', 'category_tree', 'product_facets', *PRODUCT_LIST_NAMESPACES)
+
+
+@receiver([post_save, post_delete], sender=Brand)
+def brand_changed_cache(sender, **kwargs):
+    invalidate('brands', 'product_facets', *PRODUCT_LIST_NAMESPACES)
+
+
+@receiver(post_init, sender=Product)
+def remember_product_specs(sender, instance, **kwargs):
+    instance._saved_specs = instance.__dict__.get('specifications')
+
+
+@receiver(post_save, sender=Product)
+def extract_product_attributes(sender, instance, created, raw=False, **kwargs):
+    # Deferred (unloaded) specifications were not saved, so nothing changed
+    if raw or 'specifications' not in instance.__dict__:
+        return
+    if created or instance.specifications != instance._saved_specs:
+        sync_attributes([instance])
+    instance._saved_specs = instance.specifications
+
+
+@receiver(post_init, sender=Product)
+def remember_product_pricing(sender, instance, **kwargs):
+    # Only the loaded fields; deferred ones are read before a save or delete
+    instance._saved_pricing = (
+        {field: instance.__dict__[field] for field in PRICE_FIELDS if field in instance.__dict__}
+        if instance.pk else None
+    )
+
+
+def load_missing(product_id, values):
+    missing = [field for field in PRICE_FIELDS if field not in values]
+    if missing:
+        values.update(Product.objects.filter(pk=product_id).values(*missing).first() or {})
+    return values
+
+
+@receiver([pre_save, pre_delete], sender=Product)
+def complete_saved_pricing(sender, instance, raw=False, **kwargs):
+    if instance._saved_pricing is not None and not raw:
+        load_missing(instance.pk, instance._saved_pricing)
+
+
+@receiver(post_save, sender=Product)
+def update_market_prices(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Fields still deferred were not saved, so the database has their values
+    new = load_missing(instance.pk, {
+        field: instance.__dict__[field] for field in PRICE_FIELDS if field in instance.__dict__
+    })
+    record_change(None if created else instance._saved_pricing, new)
+    instance._saved_pricing = new
+
+
+@receiver(post_delete, sender=Product)
+def remove_market_price(sender, instance, **kwargs):
+    record_change(instance._saved_pricing, None)
+
+
+@receiver(post_delete, sender=ProductImage)
+def product_image_deleted(sender, instance, **kwargs):
+    # django_cleanup removes the original upload
+    delete_variants(instance)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def product_image_changed_cache(sender, instance, raw=False, **kwargs):
+    # Cached lists render the primary image
+    if raw:
+        return
+    row = (Product.objects.filter(pk=instance.product_id)
+           .values_list('is_featured', 'is_daily_essential').first())
+    # Gone with its product, whose own delete invalidated the lists
+    if row is not None:
+        invalidate_product_lists(*row)
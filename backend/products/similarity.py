@@ -0,0 +1,440 @@
+"""
+"Similar products": nearest neighbours within a category by cosine similarity.
+
+Every product is one row of a float32 matrix per category, made of three
+blocks, each normalized and weighted by ``WEIGHTS``:
+
+- text: TF-IDF of the title, model and brand words, hashed into
+  ``TEXT_DIMENSIONS`` columns so no vocabulary has to be kept;
+- specs: ``key=value`` of text attributes, hashed the same way, and for
+  numeric attributes a point on a quarter circle placed by the value's
+  position in that key's range, so close values score close to 1;
+- price: the same quarter-circle encoding of the log price.
+
+The dot product of two rows is the weighted sum of the blocks' cosines, so
+a single matrix-vector product scores a whole category.
+
+IDF weights and spec ranges come from the last full build and stay fixed
+for incremental updates. Only manage.py rebuild_similarity_index builds:
+it saves to ``PATH``, workers load that file and have no neighbours to
+offer until it exists. Saved and deleted products are appended to a
+journal next to it; each worker reads the journal at most every
+``SYNC_INTERVAL`` seconds and reloads up to ``SYNC_BATCH`` of those
+products, so changes made in one worker reach all of them without a
+request paying for more than one batch. A rebuild empties the journal, so
+run it periodically to keep the journal, and a fresh worker's replay of
+it, short.
+"""
+
+import io
+import json
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+from .search import TOKEN_RE
+
+logger = logging.getLogger(__name__)
+
+CONFIG = {
+    'PATH': os.path.join(settings.BASE_DIR, 'product_similarity.npz'),
+    'TEXT_DIMENSIONS': 256,
+    'SPEC_DIMENSIONS': 32,
+    'WEIGHTS': {'text': 0.6, 'specs': 0.25, 'price': 0.15},
+    'PRICE_RANGE': (10, 10000000),
+    'SYNC_INTERVAL': 1,
+    'SYNC_BATCH': 1000,
+    **getattr(settings, 'PRODUCT_SIMILARITY', {}),
+}
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 5000
+RECORD_FIELDS = ('pk', 'category_id', 'is_available', 'title', 'model', 'brand__name', 'price')
+
+
+def _bucket(token, size):
+    # crc32 rather than hash(): buckets must agree across processes
+    return zlib.crc32(token.encode('utf-8')) % size
+
+
+def _scale(number):
+    return math.copysign(math.log1p(abs(number)), number)
+
+
+def _angle(value, low, high):
+    position = (value - low) / (high - low) if high > low else 0.0
+    return min(max(position, 0.0), 1.0) * math.pi / 2
+
+
+def product_records(queryset):
+    """(pk, category, available, title, model, brand, price, attributes) per product, in chunks."""
+    from .models import ProductAttribute
+
+    rows = queryset.order_by().values_list(*RECORD_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        attributes = defaultdict(list)
+        for product_id, key, text, number in ProductAttribute.objects.filter(
+            product_id__in=[row[0] for row in chunk]
+        ).values_list('product_id', 'key', 'value_text', 'value_number').iterator(chunk_size=CHUNK_SIZE):
+            attributes[product_id].append((key, text, number))
+        yield [row + (attributes[row[0]],) for row in chunk]
+
+
+class Vectorizer:
+    def __init__(self, idf, spec_ranges):
+        self.text_dimensions = CONFIG['TEXT_DIMENSIONS']
+        self.spec_dimensions = CONFIG['SPEC_DIMENSIONS']
+        self.dimensions = self.text_dimensions + self.spec_dimensions + 2
+        self.idf = idf
+        self.spec_ranges = spec_ranges
+        low, high = CONFIG['PRICE_RANGE']
+        self.price_range = (math.log(low), math.log(high))
+
+    @staticmethod
+    def text_buckets(record):
+        _, _, _, title, model, brand, _, _ = record
+        words = TOKEN_RE.findall(f'{title} {model} {brand or ""}'.lower())
+        return Counter(_bucket(word, CONFIG['TEXT_DIMENSIONS']) for word in words)
+
+    @classmethod
+    def fit(cls, chunks):
+        """Document frequencies and numeric spec ranges over all products."""
+        size = CONFIG['TEXT_DIMENSIONS']
+        frequencies = np.zeros(size, dtype=np.int64)
+        ranges = {}
+        total = 0
+        for records in chunks:
+            for record in records:
+                total += 1
+                for bucket in cls.text_buckets(record):
+                    frequencies[bucket] += 1
+                for key, _, number in record[-1]:
+                    if number is not None:
+                        value = _scale(number)
+                        low, high = ranges.get(key, (value, value))
+                        ranges[key] = (min(low, value), max(high, value))
+        idf = (np.log((1 + total) / (1 + frequencies)) + 1).astype(np.float32)
+        return cls(idf, ranges)
+
+    def blocks(self):
+        specs_end = self.text_dimensions + self.spec_dimensions
+        return {
+            'text': slice(0, self.text_dimensions),
+            'specs': slice(self.text_dimensions, specs_end),
+            'price': slice(specs_end, specs_end + 2),
+        }
+
+    def transform(self, records):
+        rows, columns, values = [], [], []
+
+        def add(row, column, value):
+            rows.append(row)
+            columns.append(column)
+            values.append(value)
+
+        pairs = self.spec_dimensions // 2
+        price_column = self.text_dimensions + self.spec_dimensions
+        for row, record in enumerate(records):
+            for bucket, count in self.text_buckets(record).items():
+                add(row, bucket, (1 + math.log(count)) * self.idf[bucket])
+            for key, text, number in record[-1]:
+                if number is not None and key in self.spec_ranges:
+                    column = self.text_dimensions + 2 * _bucket(key, pairs)
+                    angle = _angle(_scale(number), *self.spec_ranges[key])
+                    add(row, column, math.cos(angle))
+                    add(row, column + 1, math.sin(angle))
+                else:
+                    add(row, self.text_dimensions + _bucket(f'{key}={text}', self.spec_dimensions), 1.0)
+            price = record[6]
+            if price and price > 0:
+                angle = _angle(math.log(float(price)), *self.price_range)
+                add(row, price_column, math.cos(angle))
+                add(row, price_column + 1, math.sin(angle))
+
+        matrix = np.zeros((len(records), self.dimensions), dtype=np.float32)
+        np.add.at(matrix, (rows, columns), values)
+        for name, block in self.blocks().items():
+            _normalize(matrix[:, block], math.sqrt(CONFIG['WEIGHTS'][name]))
+        _normalize(matrix)
+        return matrix
+
+
+def _normalize(matrix, length=1.0):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix *= length / np.where(norms > 0, norms, 1)
+
+
+class CategoryGroup:
+    """One category's vectors; rows are swapped with the last one on removal."""
+
+    def __init__(self, ids, available, vectors):
+        self.size = len(ids)
+        self.ids = ids
+        self.available = available
+        self.vectors = vectors
+        self.rows = {product_id: row for row, product_id in enumerate(ids.tolist())}
+
+    @classmethod
+    def empty(cls, dimensions):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), np.zeros((0, dimensions), np.float32))
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self.ids))
+        grown = []
+        for array in (self.ids, self.available, self.vectors):
+            bigger = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            bigger[:self.size] = array[:self.size]
+            grown.append(bigger)
+        self.ids, self.available, self.vectors = grown
+
+    def put(self, product_id, available, vector):
+        row = self.rows.get(product_id)
+        if row is None:
+            if self.size == len(self.ids):
+                self._grow()
+            row = self.rows[product_id] = self.size
+            self.ids[row] = product_id
+            self.size += 1
+        self.available[row] = available
+        self.vectors[row] = vector
+
+    def discard(self, product_id):
+        row = self.rows.pop(product_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved = int(self.ids[last])
+            self.ids[row], self.available[row] = moved, self.available[last]
+            self.vectors[row] = self.vectors[last]
+            self.rows[moved] = row
+        self.size = last
+
+    def nearest(self, product_id, limit):
+        row = self.rows[product_id]
+        scores = self.vectors[:self.size] @ self.vectors[row]
+        candidates = self.available[:self.size].copy()
+        candidates[row] = False
+        ids, scores = self.ids[:self.size][candidates], scores[candidates]
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+class SimilarityIndex:
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f'{path}.journal'
+        self.vectorizer = None
+        self.groups = {}
+        self.categories = {}  # product id -> category id
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._loaded_mtime = None
+        self._checked_mtime = None
+        self._journal_offset = 0
+        self._last_sync = None
+
+    def similar(self, product_id, limit):
+        """``(product id, score)`` of the ``limit`` nearest available products, or None if not indexed."""
+        self.sync()
+        with self._lock:
+            category = self.categories.get(product_id)
+            if category is None:
+                return None
+            return self.groups[category].nearest(product_id, limit)
+
+    def mark_changed(self, product_ids):
+        """Queue products for re-vectorizing (or removal) in every worker."""
+        if product_ids:
+            with open(self.journal_path, 'a') as journal:
+                journal.write(''.join(f'{product_id}\n' for product_id in product_ids))
+
+    def sync(self):
+        now = time.monotonic()
+        if self._last_sync is not None and now - self._last_sync < CONFIG['SYNC_INTERVAL']:
+            return
+        with self._sync_lock:
+            if self._last_sync is not None and now - self._last_sync < CONFIG['SYNC_INTERVAL']:
+                return
+            mtime = _mtime(self.path)
+            if mtime != self._checked_mtime:
+                # Tried once per file; a missing or unusable one waits for the next rebuild
+                self._checked_mtime = mtime
+                if mtime is None:
+                    logger.warning('No similarity index at %s; run manage.py rebuild_similarity_index', self.path)
+                elif mtime != self._loaded_mtime:
+                    self.load()
+            if self.vectorizer is not None:
+                changed = self._read_journal()
+                if changed:
+                    self.apply(changed)
+            self._last_sync = time.monotonic()
+
+    def _read_journal(self):
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return set()
+        if size < self._journal_offset:
+            # Truncated by a rebuild; its entries are replayed from the start
+            self._journal_offset = 0
+        if size == self._journal_offset:
+            return set()
+        changed = set()
+        with open(self.journal_path, 'rb') as journal:
+            journal.seek(self._journal_offset)
+            for line in islice(journal, CONFIG['SYNC_BATCH']):
+                if not line.endswith(b'\n'):
+                    # Partly written; read again next time
+                    break
+                changed.add(int(line))
+                self._journal_offset += len(line)
+        return changed
+
+    def apply(self, product_ids):
+        from .models import Product
+
+        found = set()
+        for records in product_records(Product.objects.filter(pk__in=product_ids)):
+            vectors = self.vectorizer.transform(records)
+            with self._lock:
+                for record, vector in zip(records, vectors):
+                    product_id, category, available = record[:3]
+                    found.add(product_id)
+                    self._discard(product_id)
+                    group = self.groups.get(category)
+                    if group is None:
+                        group = self.groups[category] = CategoryGroup.empty(self.vectorizer.dimensions)
+                    group.put(product_id, available, vector)
+                    self.categories[product_id] = category
+        with self._lock:
+            for product_id in set(product_ids) - found:
+                self._discard(product_id)
+
+    def _discard(self, product_id):
+        category = self.categories.pop(product_id, None)
+        if category is not None:
+            self.groups[category].discard(product_id)
+
+    def build(self, save=False, reset_journal=False):
+        """Vectorize every product; returns the number indexed."""
+        from .models import Product
+
+        started = time.monotonic()
+        if reset_journal:
+            # Changes from here on are in the build or replayed after it
+            open(self.journal_path, 'w').close()
+            offset = 0
+        else:
+            offset = _size(self.journal_path)
+        vectorizer = Vectorizer.fit(product_records(Product.objects.all()))
+        ids, categories, available, vectors = [], [], [], []
+        for records in product_records(Product.objects.all()):
+            ids.extend(record[0] for record in records)
+            categories.extend(record[1] for record in records)
+            available.extend(record[2] for record in records)
+            vectors.append(vectorizer.transform(records))
+        arrays = {
+            'ids': np.array(ids, dtype=np.int64),
+            'categories': np.array(categories, dtype=np.int64),
+            'available': np.array(available, dtype=bool),
+            'vectors': np.concatenate(vectors) if vectors else np.zeros((0, vectorizer.dimensions), np.float32),
+        }
+        self._install(vectorizer, arrays, offset, None)
+        if save:
+            self.save(vectorizer, arrays)
+            self._loaded_mtime = self._checked_mtime = _mtime(self.path)
+        logger.info('Built the similarity index of %d products in %.1fs', len(ids), time.monotonic() - started)
+        return len(ids)
+
+    def save(self, vectorizer, arrays):
+        spec_keys = sorted(vectorizer.spec_ranges)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer, meta=np.array(json.dumps(self.meta())), idf=vectorizer.idf,
+            spec_keys=np.array(spec_keys, dtype=str),
+            spec_ranges=np.array([vectorizer.spec_ranges[key] for key in spec_keys], dtype=np.float64).reshape(-1, 2),
+            **arrays,
+        )
+        # Written whole and renamed, so workers never load a partial file
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'wb') as snapshot:
+            snapshot.write(buffer.getbuffer())
+        os.replace(temporary, self.path)
+
+    def load(self):
+        mtime = _mtime(self.path)
+        if mtime is None:
+            return False
+        with np.load(self.path) as snapshot:
+            if json.loads(str(snapshot['meta'])) != self.meta():
+                logger.warning('Similarity index at %s was built with other settings; run '
+                               'manage.py rebuild_similarity_index', self.path)
+                return False
+            spec_ranges = {
+                key: (float(low), float(high))
+                for key, (low, high) in zip(snapshot['spec_keys'].tolist(), snapshot['spec_ranges'])
+            }
+            vectorizer = Vectorizer(snapshot['idf'], spec_ranges)
+            arrays = {name: snapshot[name] for name in ('ids', 'categories', 'available', 'vectors')}
+        # A rebuild empties the journal before reading products, so replay all of it
+        self._install(vectorizer, arrays, 0, mtime)
+        self._checked_mtime = mtime
+        return True
+
+    def _install(self, vectorizer, arrays, journal_offset, mtime):
+        order = np.argsort(arrays['categories'], kind='stable')
+        categories = arrays['categories'][order]
+        starts = np.flatnonzero(np.r_[True, categories[1:] != categories[:-1]]) if len(categories) else []
+        ends = list(starts[1:]) + [len(categories)]
+        groups, located = {}, {}
+        for start, end in zip(starts, ends):
+            rows = order[start:end]
+            category = int(categories[start])
+            groups[category] = CategoryGroup(arrays['ids'][rows], arrays['available'][rows], arrays['vectors'][rows])
+            located.update(dict.fromkeys(groups[category].rows, category))
+        with self._lock:
+            self.vectorizer, self.groups, self.categories = vectorizer, groups, located
+            self._journal_offset, self._loaded_mtime = journal_offset, mtime
+
+    @staticmethod
+    def meta():
+        return {
+            'version': FORMAT_VERSION,
+            'text_dimensions': CONFIG['TEXT_DIMENSIONS'],
+            'spec_dimensions': CONFIG['SPEC_DIMENSIONS'],
+            'weights': CONFIG['WEIGHTS'],
+            'price_range': list(CONFIG['PRICE_RANGE']),
+        }
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+similarity_index = SimilarityIndex(CONFIG['PATH'])
@@ -0,0 +1,143 @@
+import re
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from techsafar.bulk import bulk_insert
+
+SPEC_PARAM_PREFIX = 'spec.'
+LOOKUPS = ('exact', 'gt', 'gte', 'lt', 'lte')
+
+# unit -> (canonical unit, factor to the canonical unit)
+UNITS = {
+    'kb': ('gb', 1 / 1024 ** 2), 'mb': ('gb', 1 / 1024), 'gb': ('gb', 1), 'tb': ('gb', 1024),
+    'mhz': ('ghz', 1 / 1000), 'ghz': ('ghz', 1),
+    'mah': ('mah', 1), 'mp': ('mp', 1), 'hz': ('hz', 1), 'w': ('w', 1),
+    'inch': ('inch', 1), 'inches': ('inch', 1), 'in': ('inch', 1),
+    'gen': ('gen', 1), 'generation': ('gen', 1),
+}
+
+PLAIN_NUMBER_RE = re.compile(r'^-?\d+(?:\.\d+)?$')
+NUMBER_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)(?:st|nd|rd|th)?\s*([a-z]+)?')
+KEY_RE = re.compile(r'[^a-z0-9]+')
+# Stored as 1/0 in value_number, so "Yes" and ?spec.x=true match
+BOOLEANS = {'yes': 1.0, 'true': 1.0, 'no': 0.0, 'false': 0.0}
+
+
+def normalize_key(key):
+    return KEY_RE.sub('_', str(key).lower()).strip('_')
+
+
+def parse_value(value):
+    """
+    Return ``(text, number, unit)`` for a spec value. Numbers are converted
+    to the canonical unit of their family, so "1 TB" and "1024GB" compare
+    equal.
+    """
+    if isinstance(value, bool):
+        return ('true' if value else 'false'), float(value), ''
+    if isinstance(value, (int, float)):
+        return str(value).lower(), float(value), ''
+    text = str(value).strip().lower()
+    match = NUMBER_RE.match(text)
+    if not match:
+        return text, BOOLEANS.get(text), ''
+    number, unit = float(match.group(1)), match.group(2) or ''
+    if unit in UNITS:
+        unit, factor = UNITS[unit]
+        number *= factor
+    else:
+        unit = ''
+    return text, number, unit
+
+
+def flatten(specifications, prefix=''):
+    if isinstance(specifications, dict):
+        for key, value in specifications.items():
+            name = normalize_key(key)
+            yield from flatten(value, f'{prefix}_{name}' if prefix else name)
+    elif isinstance(specifications, (list, tuple)):
+        for value in specifications:
+            yield from flatten(value, prefix)
+    elif prefix and specifications is not None and specifications != '':
+        yield prefix, specifications
+
+
+# Columns of the rows made by attribute_rows
+ATTRIBUTE_FIELDS = ['product', 'key', 'value_text', 'value_number', 'unit']
+
+
+def attribute_rows(product_id, specifications):
+    """One ``ATTRIBUTE_FIELDS`` row per flattened specification."""
+    rows = []
+    for key, value in flatten(specifications or {}):
+        text, number, unit = parse_value(value)
+        rows.append([product_id, key[:64], text[:255], number, unit])
+    return rows
+
+
+def sync_attributes(products, replace=True):
+    """
+    Replace the attribute rows of ``products`` with freshly extracted ones.
+    Pass ``replace=False`` for products that cannot have any rows yet.
+    """
+    from .models import ProductAttribute
+
+    products = list(products)
+    rows = [row for product in products for row in attribute_rows(product.pk, product.specifications)]
+    with transaction.atomic():
+        if replace:
+            ProductAttribute.objects.filter(product_id__in=[product.pk for product in products]).delete()
+        # Plain executemany; bulk_create spent most of an import preparing instances
+        bulk_insert(ProductAttribute, ATTRIBUTE_FIELDS, rows)
+    return len(rows)
+
+
+def parse_spec_param(param):
+    """
+    ``spec.ram_gb__gte`` -> ``('ram', 'gb', 'gte')``. A trailing known unit
+    is split off the key; the value is then read in that unit.
+    """
+    name = param[len(SPEC_PARAM_PREFIX):]
+    key, _, lookup = name.partition('__')
+    lookup = lookup or 'exact'
+    if lookup not in LOOKUPS:
+        raise ValidationError({param: f'Unsupported lookup "{lookup}".'})
+    key = normalize_key(key)
+    base, _, unit = key.rpartition('_')
+    if base and unit in UNITS:
+        return base, unit, lookup
+    return key, '', lookup
+
+
+def spec_conditions(query_params):
+    """
+    Yield ``ProductAttribute`` filter kwargs for every ``spec.*`` parameter.
+    Each one becomes an indexed lookup on (key, value).
+    """
+    for param, values in query_params.lists():
+        if not param.startswith(SPEC_PARAM_PREFIX):
+            continue
+        key, unit, lookup = parse_spec_param(param)
+        for raw in values:
+            if unit:
+                try:
+                    number = float(raw)
+                except ValueError:
+                    raise ValidationError({param: 'Expected a number.'})
+                canonical, factor = UNITS[unit]
+                yield {'key': key, 'unit': canonical, f'value_number__{lookup}': number * factor}
+            elif lookup != 'exact':
+                try:
+                    number = float(raw)
+                except ValueError:
+                    raise ValidationError({param: 'Expected a number.'})
+                yield {'key': key, f'value_number__{lookup}': number}
+            else:
+                text = raw.strip().lower()
+                if PLAIN_NUMBER_RE.match(text):
+                    yield {'key': key, 'value_number': float(text)}
+                elif text in BOOLEANS:
+                    yield {'key': key, 'value_number': BOOLEANS[text]}
+                else:
+                    yield {'key': key, 'value_text': text}
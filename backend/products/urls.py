@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # Category endpoints
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
+    path('categories/tree/', views.CategoryTreeView.as_view(), name='category-tree'),
     
     # Brand endpoints
     path('brands/', views.BrandListView.as_view(), name='brand-list'),
@@ -13,7 +14,11 @@ urlpatterns = [
     path('', views.ProductListView.as_view(), name='product-list'),
     path('featured/', views.FeaturedProductListView.as_view(), name='featured-product-list'),
     path('daily-essentials/', views.DailyEssentialsListView.as_view(), name='daily-essentials-list'),
+    path('facets/', views.ProductFacetView.as_view(), name='product-facets'),
+    path('import/', views.ProductImportView.as_view(), name='product-import'),
+    path('price-check/', views.PriceCheckView.as_view(), name='product-price-check'),
     path('<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('<int:pk>/similar/', views.SimilarProductListView.as_view(), name='similar-product-list'),
     
     # Review endpoints
     path('<int:product_id>/reviews/', views.ReviewListView.as_view(), name='review-list'),
@@ -1,46 +1,208 @@
+import io
+
 from rest_framework import generics, permissions, status, filters
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Product, Category, Review
 from .serializers import (
-    ProductSerializer, ProductCreateSerializer,
-    CategorySerializer, ReviewSerializer
+    ProductSerializer, ProductListSerializer, ProductCreateSerializer,
+    CategorySerializer, CategoryTreeSerializer, ReviewSerializer, PriceCheckSerializer
 )
-from .permissions import IsSellerOrReadOnly
+from .permissions import IsSellerAccount, IsSellerOrReadOnly
+from .filters import ProductFilter, ProductSearchFilter
+from .counters import view_counter
+from .facets import cached_facets
+from .pricing import CONFIG as PRICING, market_stats, price_position, summary
+from .similarity import similarity_index
+from .imports import CONFIG as IMPORTS, ImportFormatError, detect_format, import_products
+from techsafar.pagination import KeysetOrPageNumberPagination
+from techsafar.fieldsets import requested_fields
+from techsafar.cache import CachedListMixin
+from techsafar.conditional import ConditionalGetMixin
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(CachedListMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_namespace = 'categories'
+    permission_classes = [permissions.AllowAny]
+
+class CategoryTreeView(CachedListMixin, generics.ListAPIView):
+    # Ordered by path, so parents always come before their children
+    queryset = Category.objects.annotate(product_count=Count('products')).order_by('path')
+    serializer_class = CategoryTreeSerializer
+    cache_namespace = 'category_tree'
     permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    query_budget = 1
 
-class ProductListView(generics.ListCreateAPIView):
+class ProductListingMixin:
+    # Only join and load what the serializer will render for this request
+    def get_queryset(self):
+        fields = requested_fields(self.get_serializer_class(), self.request)
+        return super().get_queryset().for_listing(fields)
+
+class ProductListView(ConditionalGetMixin, ProductListingMixin, generics.ListCreateAPIView):
     queryset = Product.objects.all()
+    # Rating aggregates change without touching updated_at
+    etag_fields = ('updated_at', 'total_ratings', 'rating_sum')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'condition', 'brand', 'is_available', 'is_negotiable']
-    search_fields = ['title', 'description', 'brand', 'model']
-    ordering_fields = ['price', 'created_at', 'views']
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
+    filterset_class = ProductFilter
+    search_fields = ['title', 'description', 'brand__name', 'model']
+    ordering_fields = ['price', 'created_at', 'views', 'rating', 'total_ratings']
+    pagination_class = KeysetOrPageNumberPagination
+    # validators + count + page
+    query_budget = 3
+    # Plus, per parameter given: the ?category= row (its path for
+    # include_descendants), and for ?facets= the filters run again (one
+    # query) and the grouped pass, unless cached
+    query_budget_params = {'category': 1, 'facets': 2}
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ProductCreateSerializer
-        return ProductSerializer
+        return ProductListSerializer
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Opt-in facet counts for the same filters: ?facets=1
+        if response.status_code == 200 and request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = cached_facets(lambda: self.filter_queryset(Product.objects.all()), request)
+        return response
 
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProductFacetView(generics.GenericAPIView):
+    """
+    Counts per brand, category, condition, flag and price bucket for the
+    products matching the same filters and search as the product list.
+    """
+    queryset = Product.objects.all()
+    permission_classes = [permissions.AllowAny]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    search_fields = ['title', 'description', 'brand__name', 'model']
+    # ?category= lookup + one grouped pass
+    query_budget = 2
+
+    def get(self, request, *args, **kwargs):
+        return Response(cached_facets(lambda: self.filter_queryset(self.get_queryset()), request))
+
+class ProductDetailView(ConditionalGetMixin, ProductListingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsSellerOrReadOnly]
+    etag_fields = ('updated_at', 'total_ratings', 'rating_sum')
+    # validators + row + images
+    query_budget = 3
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        instance.views += 1
-        instance.save()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        response = super().retrieve(request, *args, **kwargs)
+        # Revalidated (304) reads count too. Buffered and flushed in batches;
+        # see products.counters
+        pk = int(kwargs['pk'])
+        view_counter.record(pk)
+        if response.status_code == 200 and 'views' in response.data:
+            response.data['views'] += view_counter.pending(pk)
+        return response
+
+class SimilarProductListView(ProductListingMixin, generics.ListAPIView):
+    """
+    Up to ``?limit=`` available products of the same category most similar
+    to this one (see products.similarity), best first, each card with its
+    ``similarity`` score.
+    """
+    queryset = Product.objects.all()
+    serializer_class = ProductListSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    default_limit = 12
+    max_limit = 50
+    # the neighbours' cards; scoring is in memory, but up to SYNC_BATCH products
+    # changed since the last lookup are reloaded first (two queries)
+    query_budget = 3
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = min(max(limit, 1), self.max_limit)
+
+        neighbours = similarity_index.similar(int(kwargs['pk']), limit)
+        if neighbours is None:
+            # Not indexed (yet): 404 for unknown products, no neighbours otherwise
+            get_object_or_404(Product.objects.only('pk'), pk=kwargs['pk'])
+            neighbours = []
+        scores = dict(neighbours)
+        # Ranked here, so the database need not sort
+        queryset = self.get_queryset().filter(pk__in=scores).order_by()
+        products = sorted(queryset, key=lambda product: -scores[product.pk])
+        data = self.get_serializer(products, many=True).data
+        for item, product in zip(data, products):
+            item['similarity'] = round(scores[product.pk], 4)
+        return Response(data)
+
+class PriceCheckView(APIView):
+    """
+    Market prices for a listing being priced, from ``category``,
+    ``condition`` and optionally ``brand``, ``model`` and ``price`` query
+    parameters. ``market`` is the most specific group with enough listings,
+    ``groups`` every group found, and ``price`` how the given price compares.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSellerAccount]
+    # all the listing's groups by key
+    query_budget = 1
+
+    def get(self, request, *args, **kwargs):
+        serializer = PriceCheckSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        found = [
+            summary(stats) for stats in
+            market_stats(params['category'], params.get('brand'), params.get('model'), params['condition'])
+        ]
+        market = next((group for group in found if group['listings'] >= PRICING['MIN_LISTINGS']), None)
+        price = None
+        if market is not None and params.get('price') is not None:
+            price = price_position(params['price'], market)
+        return Response({'market': market, 'groups': found, 'price': price})
+
+class ProductImportView(APIView):
+    """
+    Bulk import the uploaded ``file`` (CSV or NDJSON) as the current user's
+    products. Uploads are streamed from Django's upload handler, never read
+    into memory whole. Responds with per-row errors and throughput. Files
+    above ``PRODUCT_IMPORT['MAX_UPLOAD_SIZE']`` are refused (see products.imports).
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSellerAccount]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.size > IMPORTS['MAX_UPLOAD_SIZE']:
+            return Response(
+                {'file': [f'Files above {IMPORTS["MAX_UPLOAD_SIZE"] // 1024} KB must be imported with '
+                          'manage.py import_products.']},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        fmt = request.data.get('format') or detect_format(upload.name)
+        dry_run = request.data.get('dry_run') in ('1', 'true')
+        stream = io.TextIOWrapper(upload.open('rb'), encoding='utf-8-sig', newline='')
+        try:
+            report = import_products(stream, fmt, request.user, dry_run=dry_run)
+        except ImportFormatError as exc:
+            return Response({'format': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({'file': ['File must be UTF-8 encoded.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
 
 class ReviewCreateView(generics.CreateAPIView):
     queryset = Review.objects.all()
@@ -57,32 +219,44 @@ class ReviewCreateView(generics.CreateAPIView):
 class ReviewListView(generics.ListAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetOrPageNumberPagination
+    query_budget = 2
 
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')
-        return Review.objects.filter(product_id=product_id)
+        return Review.objects.filter(product_id=product_id).select_related('reviewer')
 
 
 # Add these imports and views
 from .models import Brand
 from .serializers import BrandSerializer
 
-class BrandListView(generics.ListAPIView):
+class BrandListView(CachedListMixin, generics.ListAPIView):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+    cache_namespace = 'brands'
     permission_classes = [permissions.AllowAny]
 
-class FeaturedBrandListView(generics.ListAPIView):
+class FeaturedBrandListView(CachedListMixin, generics.ListAPIView):
     queryset = Brand.objects.filter(is_featured=True)
     serializer_class = BrandSerializer
+    cache_namespace = 'brands'
     permission_classes = [permissions.AllowAny]
 
-class FeaturedProductListView(generics.ListAPIView):
+class FeaturedProductListView(CachedListMixin, ConditionalGetMixin, ProductListingMixin, generics.ListAPIView):
     queryset = Product.objects.filter(is_featured=True)
-    serializer_class = ProductSerializer
+    serializer_class = ProductListSerializer
+    cache_namespace = 'featured_products'
     permission_classes = [permissions.AllowAny]
+    etag_fields = ('updated_at', 'total_ratings', 'rating_sum')
+    # validators + count + page (on a cache miss)
+    query_budget = 3
 
-class DailyEssentialsListView(generics.ListAPIView):
+class DailyEssentialsListView(CachedListMixin, ConditionalGetMixin, ProductListingMixin, generics.ListAPIView):
     queryset = Product.objects.filter(is_daily_essential=True)
-    serializer_class = ProductSerializer
-    permission_classes = [permissions.AllowAny]
\ No newline at end of file
+    serializer_class = ProductListSerializer
+    cache_namespace = 'daily_essentials'
+    permission_classes = [permissions.AllowAny]
+    etag_fields = ('updated_at', 'total_ratings', 'rating_sum')
+    # validators + count + page (on a cache miss)
+    query_budget = 3
\ No newline at end of file
@@ -1,7 +1,25 @@
 from django.db import models
 from django.conf import settings
+from techsafar.ratings import RatingAggregate
 
-class Shop(models.Model):
+class ShopQuerySet(models.QuerySet):
+    def for_listing(self, fields=None):
+        # Same idea as ProductQuerySet.for_listing()
+        def wanted(name):
+            return fields is None or name in fields
+
+        queryset = self
+        if wanted('owner_name'):
+            queryset = queryset.select_related('owner')
+        if wanted('images'):
+            queryset = queryset.prefetch_related('images')
+        if wanted('reviews'):
+            queryset = queryset.prefetch_related(
+                models.Prefetch('reviews', queryset=ShopReview.objects.select_related('reviewer'))
+            )
+        return queryset
+
+class Shop(RatingAggregate):
     owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='shop')
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -13,13 +31,19 @@ class Shop(models.Model):
     website = models.URLField(blank=True)
     business_hours = models.JSONField()  # Store business hours as JSON
     is_verified = models.BooleanField(default=False)
-    rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    total_ratings = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShopQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-rating'], name='shop_rating_idx'),
+            models.Index(fields=['created_at', 'id'], name='shop_created_idx'),
+            # Covers the list ETag aggregates
+            models.Index(fields=['updated_at', 'total_ratings', 'rating_sum'], name='shop_validators_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -35,6 +59,7 @@ class ShopReview(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['shop', 'reviewer']
+        indexes = [models.Index(fields=['shop', 'created_at', 'id'], name='shopreview_shop_created_idx')]
 
     def __str__(self):
         return f"Review by {self.reviewer.username} for {self.shop.name}"
@@ -42,11 +67,14 @@ class ShopReview(models.Model):
 class ShopImage(models.Model):
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='shop_images/')
+    # Resized copies by name, filled in by techsafar.images
+    variants = models.JSONField(default=dict, blank=True)
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-is_primary', 'created_at']
+        indexes = [models.Index(fields=['shop', '-is_primary', 'created_at'], name='shopimage_primary_idx')]
 
     def __str__(self):
         return f"Image for {self.shop.name}" 
\ No newline at end of file
@@ -1,10 +1,17 @@
 from rest_framework import serializers
+from techsafar.fieldsets import SparseFieldsetMixin
+from techsafar.images import schedule, strip_metadata, variant_urls
 from .models import Shop, ShopReview, ShopImage
 
 class ShopImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ShopImage
-        fields = ('id', 'image', 'is_primary')
+        fields = ('id', 'image', 'variants', 'is_primary')
+
+    def get_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
 
 class ShopReviewSerializer(serializers.ModelSerializer):
     reviewer_name = serializers.CharField(source='reviewer.username', read_only=True)
@@ -14,25 +21,23 @@ class ShopReviewSerializer(serializers.ModelSerializer):
         fields = ('id', 'reviewer', 'reviewer_name', 'rating', 'comment', 'created_at', 'updated_at')
         read_only_fields = ('reviewer',)
 
-class ShopSerializer(serializers.ModelSerializer):
+class ShopSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner_name = serializers.CharField(source='owner.username', read_only=True)
     images = ShopImageSerializer(many=True, read_only=True)
     reviews = ShopReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(source='rating', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Shop
         fields = ('id', 'owner', 'owner_name', 'name', 'description', 'logo',
                  'cover_image', 'address', 'phone_number', 'email', 'website',
                  'business_hours', 'is_verified', 'rating', 'total_ratings',
-                 'images', 'reviews', 'average_rating', 'created_at', 'updated_at')
+                 'images', 'reviews', 'average_rating', 'rating_histogram',
+                 'created_at', 'updated_at')
         read_only_fields = ('owner', 'is_verified', 'rating', 'total_ratings')
-
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if not reviews:
-            return 0
-        return sum(review.rating for review in reviews) / len(reviews)
+        # Also served by /reviews/; only sent with ?expand=reviews
+        expandable_fields = ('reviews',)
 
 class ShopCreateSerializer(serializers.ModelSerializer):
     images = serializers.ListField(
@@ -49,12 +54,16 @@ class ShopCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         images = validated_data.pop('images', [])
         shop = Shop.objects.create(**validated_data)
-        
-        for i, image in enumerate(images):
-            ShopImage.objects.create(
+
+        created = ShopImage.objects.bulk_create([
+            ShopImage(
                 shop=shop,
-                image=image,
+                image=strip_metadata(image),
                 is_primary=(i == 0)  # First image is primary
             )
-        
+            for i, image in enumerate(images)
+        ])
+        # Variants are rendered in the background
+        schedule(ShopImage, [image.pk for image in created])
+
         return shop 
\ No newline at end of file
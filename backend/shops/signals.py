@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from techsafar.conditional import record_deletion
+from techsafar.images import delete_variants
+from techsafar.ratings import apply_rating_change
+from .models import Shop, ShopImage, ShopReview
+
+
+@receiver(post_init, sender=ShopReview)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._saved_rating = instance.rating if instance.pk else None
+
+
+@receiver(post_save, sender=ShopReview)
+def review_saved(sender, instance, created, **kwargs):
+    old = None if created else instance._saved_rating
+    apply_rating_change(Shop, instance.shop_id, old, instance.rating)
+    instance._saved_rating = instance.rating
+
+
+@receiver(post_delete, sender=ShopReview)
+def review_deleted(sender, instance, **kwargs):
+    apply_rating_change(Shop, instance.shop_id, instance._saved_rating, None)
+
+
+@receiver(post_delete, sender=ShopImage)
+def shop_image_deleted(sender, instance, **kwargs):
+    # django_cleanup removes the original upload
+    delete_variants(instance)
+
+
+@receiver(post_delete, sender=Shop)
+def shop_deleted(sender, instance, **kwargs):
+    # Lists' Last-Modified; see techsafar.conditional
+    record_deletion(Shop)
@@ -4,14 +4,24 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Shop, ShopReview
 from .serializers import ShopSerializer, ShopCreateSerializer, ShopReviewSerializer
 from .permissions import IsShopOwnerOrReadOnly
+from techsafar.pagination import KeysetOrPageNumberPagination
+from techsafar.fieldsets import requested_fields
+from techsafar.conditional import ConditionalGetMixin
 
-class ShopListView(generics.ListCreateAPIView):
+class ShopListingMixin:
+    def get_queryset(self):
+        fields = requested_fields(self.get_serializer_class(), self.request)
+        return super().get_queryset().for_listing(fields)
+
+class ShopListView(ConditionalGetMixin, ShopListingMixin, generics.ListCreateAPIView):
     queryset = Shop.objects.all()
+    # Rating aggregates change without touching updated_at
+    etag_fields = ('updated_at', 'total_ratings', 'rating_sum')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_verified']
     search_fields = ['name', 'description', 'address']
-    ordering_fields = ['rating', 'created_at']
+    ordering_fields = ['rating', 'total_ratings', 'created_at']
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -21,8 +31,9 @@ class ShopListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-class ShopDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ShopDetailView(ConditionalGetMixin, ShopListingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Shop.objects.all()
+    etag_fields = ('updated_at', 'total_ratings', 'rating_sum')
     serializer_class = ShopSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsShopOwnerOrReadOnly]
 
@@ -41,7 +52,8 @@ class ShopReviewCreateView(generics.CreateAPIView):
 class ShopReviewListView(generics.ListAPIView):
     serializer_class = ShopReviewSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetOrPageNumberPagination
 
     def get_queryset(self):
         shop_id = self.kwargs.get('shop_id')
-        return ShopReview.objects.filter(shop_id=shop_id) 
\ No newline at end of file
+        return ShopReview.objects.filter(shop_id=shop_id).select_related('reviewer') 
\ No newline at end of file
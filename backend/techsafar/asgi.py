@@ -5,17 +5,28 @@ ASGI config for techsafar project.
 import os
 
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from chat.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'techsafar.settings')
 
+# Set up Django before importing anything that loads models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from chat.ids import message_ids  # noqa: E402
+from chat.routing import websocket_urlpatterns  # noqa: E402
+from users.middleware import JWTAuthMiddleware  # noqa: E402
+from .metrics import WebSocketMetricsMiddleware  # noqa: E402
+
+# Fail now rather than on the first chat message without a worker id
+message_ids.worker_id
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            websocket_urlpatterns
+    "http": django_asgi_app,
+    "websocket": WebSocketMetricsMiddleware(
+        JWTAuthMiddleware(
+            URLRouter(
+                websocket_urlpatterns
+            )
         )
     ),
-}) 
\ No newline at end of file
+})
\ No newline at end of file
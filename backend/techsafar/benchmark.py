@@ -0,0 +1,240 @@
+"""
+In-process endpoint benchmarks (manage.py run_benchmarks).
+
+Each scenario sends real requests through the full Django stack, with JWT
+authentication, middleware and rendering, and records per-request latency,
+database queries and response bytes. Queries are counted on every database
+connection, so work done in other threads, such as the WebSocket consumer's
+``database_sync_to_async`` calls and write-behind flushes, is counted too.
+Results are plain dicts meant for JSON output and ``compare()``.
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.backends.signals import connection_created
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.models import ChatParticipant, Message
+from products.models import Category, Product
+from users.models import User
+from .harness import request_host
+
+# Relative increase of p50/p99 latency reported as a regression by compare()
+TOLERANCE = 0.2
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class QueryCounter:
+    """Counts queries on every connection, including ones opened later by other threads."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def wrap(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        connection_created.connect(self._connection_created, weak=False)
+        for connection in connections.all():
+            self.wrap(connection)
+
+    def _connection_created(self, sender, connection, **kwargs):
+        self.wrap(connection)
+
+
+def summarize(latencies, queries, sizes, statuses, elapsed):
+    """Scenario statistics; ``latencies`` in seconds, ``queries`` and ``sizes`` per request."""
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(statistics.median(milliseconds), 3),
+        'p99_ms': round(percentile(milliseconds, 0.99), 3),
+        'mean_ms': round(statistics.fmean(milliseconds), 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'queries_mean': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+        'bytes_mean': round(statistics.fmean(sizes)) if sizes else 0,
+        'statuses': dict(Counter(str(status) for status in statuses)),
+    }
+
+
+class BenchmarkRunner:
+    """
+    Drives the scenarios against whatever data the database holds, normally
+    a dataset from seed_benchmark_data. Products, users and rooms for each
+    request are picked with a seeded RNG, so runs are comparable.
+    """
+
+    def __init__(self, requests=200, warmup=20, seed=1, sample_size=1000):
+        self.requests = requests
+        self.warmup = warmup
+        self.rng = random.Random(seed)
+        self.counter = QueryCounter()
+        self.tokens = {}
+
+        bounds = Product.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        self.product_ids = []
+        if bounds['high'] is not None:
+            candidates = range(bounds['low'], bounds['high'] + 1)
+            sample = self.rng.sample(candidates, min(sample_size, len(candidates)))
+            self.product_ids = sorted(Product.objects.filter(pk__in=sample).values_list('pk', flat=True))
+        self.category_ids = list(Category.objects.filter(children__isnull=True).values_list('pk', flat=True))
+        self.memberships = list(
+            ChatParticipant.objects.order_by('-chat_room_id').values_list('chat_room_id', 'user_id')[:sample_size]
+        )
+        self.buyer = User.objects.filter(user_type='buyer').order_by('pk').first()
+
+    def token(self, user_id):
+        if user_id not in self.tokens:
+            self.tokens[user_id] = str(AccessToken.for_user(User(pk=user_id)))
+        return self.tokens[user_id]
+
+    def scenarios(self):
+        """name -> callable returning (path, user id) for the next request."""
+        scenarios = {}
+        buyer_id = self.buyer.pk if self.buyer else None
+        if self.product_ids:
+            scenarios.update({
+                'product_list': lambda: ('/api/products/', buyer_id),
+                'product_list_category_by_price': lambda: (
+                    f'/api/products/?category={self.rng.choice(self.category_ids)}&ordering=price', buyer_id),
+                'product_search': lambda: (
+                    f'/api/products/?search={self.rng.choice(["ssd", "battery", "warranty", "oled"])}', buyer_id),
+                'product_detail': lambda: (f'/api/products/{self.rng.choice(self.product_ids)}/', buyer_id),
+                'product_similar': lambda: (f'/api/products/{self.rng.choice(self.product_ids)}/similar/', buyer_id),
+            })
+        scenarios['shop_list'] = lambda: ('/api/shops/', buyer_id)
+        if self.memberships:
+            def room_list():
+                return '/api/chat/rooms/', self.rng.choice(self.memberships)[1]
+
+            def message_list():
+                room_id, user_id = self.rng.choice(self.memberships)
+                return f'/api/chat/rooms/{room_id}/messages/', user_id
+
+            scenarios.update({'chat_room_list': room_list, 'chat_message_list': message_list})
+        return scenarios
+
+    def run(self, only=None):
+        self.counter.install()
+        results = {}
+        client = Client(HTTP_HOST=request_host())
+        for name, next_request in self.scenarios().items():
+            if only and name not in only:
+                continue
+            results[name] = self.run_http(client, next_request)
+        if self.memberships and (not only or 'chat_websocket' in only):
+            results['chat_websocket'] = asyncio.run(self.run_websocket())
+        return results
+
+    def run_http(self, client, next_request):
+        for _ in range(self.warmup):
+            path, user_id = next_request()
+            client.get(path, HTTP_AUTHORIZATION=f'Bearer {self.token(user_id)}')
+
+        latencies, queries, sizes, statuses = [], [], [], []
+        started = time.perf_counter()
+        for _ in range(self.requests):
+            path, user_id = next_request()
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {self.token(user_id)}'}
+            before = self.counter.count
+            request_started = time.perf_counter()
+            response = client.get(path, **headers)
+            latencies.append(time.perf_counter() - request_started)
+            queries.append(self.counter.count - before)
+            sizes.append(len(response.content))
+            statuses.append(response.status_code)
+        return summarize(latencies, queries, sizes, statuses, time.perf_counter() - started)
+
+    async def run_websocket(self):
+        """
+        One session per request: connect with a token, replay the last 50
+        messages (``?last_id=``), send a message and wait for its echo.
+        """
+        from channels.db import database_sync_to_async
+        from channels.testing import WebsocketCommunicator
+
+        from chat.buffer import message_buffer
+        from techsafar.asgi import application
+
+        @database_sync_to_async
+        def replay_from(room_ids):
+            last_ids = {}
+            for room_id in room_ids:
+                newest = list(Message.objects.filter(chat_room_id=room_id).order_by('-id')
+                              .values_list('id', flat=True)[:51])
+                last_ids[room_id] = newest[-1] if newest else 0
+            return last_ids
+
+        # Set up before measuring
+        last_ids = await replay_from({room_id for room_id, _ in self.memberships})
+
+        async def session(room_id, user_id):
+            last_id = last_ids[room_id]
+            communicator = WebsocketCommunicator(
+                application, f'/ws/chat/{room_id}/?last_id={last_id}',
+                subprotocols=['access_token', self.token(user_id)],
+            )
+            connected, _ = await communicator.connect()
+            if connected:
+                while not json.loads(await communicator.receive_from(timeout=10)).get('synced'):
+                    pass
+                await communicator.send_to(text_data=json.dumps({'message': 'benchmark'}))
+                await communicator.receive_from(timeout=10)
+                await communicator.disconnect()
+            return connected
+
+        for _ in range(min(self.warmup, 5)):
+            await session(*self.rng.choice(self.memberships))
+
+        latencies, statuses = [], []
+        before = self.counter.count
+        started = time.perf_counter()
+        for _ in range(self.requests):
+            session_started = time.perf_counter()
+            connected = await session(*self.rng.choice(self.memberships))
+            latencies.append(time.perf_counter() - session_started)
+            statuses.append('connected' if connected else 'rejected')
+        elapsed = time.perf_counter() - started
+        # Count the buffered message writes as part of the sessions
+        await database_sync_to_async(message_buffer.flush)()
+        per_session = (self.counter.count - before) / len(latencies)
+        result = summarize(latencies, [per_session], [], statuses, elapsed)
+        result['queries_max'] = None
+        return result
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions of ``results`` against ``baseline`` (both as written by run_benchmarks)."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+        # Whole queries per request; the WebSocket mean varies a little with write batching
+        if current['queries_mean'] - previous['queries_mean'] >= 0.5:
+            regressions.append(f'{name}: queries_mean {previous["queries_mean"]} -> {current["queries_mean"]}')
+    return regressions
@@ -0,0 +1,103 @@
+"""
+Plain INSERT and UPDATE of rows given as value sequences.
+
+For writes of many rows where ``bulk_create``/``bulk_update`` would spend
+most of their time building model instances and preparing every value:
+only the field types in ``ADAPTED_TYPES`` are converted, the rest must
+already be in the column's Python type.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ADAPTED_TYPES = {'DateTimeField', 'DecimalField', 'JSONField'}
+
+
+def _preps(model_fields, connection):
+    return [
+        (lambda value, field=field: field.get_db_prep_save(value, connection))
+        if field.get_internal_type() in ADAPTED_TYPES else None
+        for field in model_fields
+    ]
+
+
+def _execute(connection, sql, params):
+    if params:
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+    return len(params)
+
+
+def _insert_parts(model, fields, connection):
+    """(table, columns, value preps, values of the other columns) of an INSERT of ``fields``."""
+    model_fields = [model._meta.get_field(name) for name in fields]
+    defaults = []
+    for field in model._meta.concrete_fields:
+        if field not in model_fields and not field.primary_key:
+            defaults.append((field, field.get_db_prep_save(field.get_default(), connection)))
+    qn = connection.ops.quote_name
+    columns = [qn(field.column) for field in model_fields] + [qn(field.column) for field, _ in defaults]
+    return qn(model._meta.db_table), columns, _preps(model_fields, connection), [value for _, value in defaults]
+
+
+def _prepare(preps, row):
+    return [value if prep is None else prep(value) for prep, value in zip(preps, row)]
+
+
+def bulk_insert(model, fields, rows):
+    """
+    INSERT ``rows`` (sequences of values for ``fields``) into ``model``'s
+    table. Other concrete fields get their default value.
+    """
+    # The connection itself; going through the django.db.connection proxy per value is slow
+    connection = connections[DEFAULT_DB_ALIAS]
+    table, columns, preps, default_values = _insert_parts(model, fields, connection)
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})'
+    return _execute(connection, sql, [_prepare(preps, row) + default_values for row in rows])
+
+
+def bulk_insert_returning(model, fields, rows):
+    """
+    ``bulk_insert`` for rows whose primary keys are needed: returns them in
+    the order of ``rows``. Multi-row INSERT ... RETURNING statements where
+    the backend supports them, one INSERT per row otherwise.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    table, columns, preps, default_values = _insert_parts(model, fields, connection)
+    params = [_prepare(preps, row) + default_values for row in rows]
+    pk = model._meta.pk
+    prefix = f'INSERT INTO {table} ({", ".join(columns)}) '
+    placeholders = ['%s'] * len(columns)
+    pks = []
+    with connection.cursor() as cursor:
+        if not connection.features.can_return_rows_from_bulk_insert:
+            sql = prefix + f'VALUES ({", ".join(placeholders)})'
+            for values in params:
+                cursor.execute(sql, values)
+                pks.append(connection.ops.last_insert_id(cursor, model._meta.db_table, pk.column))
+            return pks
+        returning, _ = connection.ops.return_insert_columns([pk])
+        batch_size = max(connection.ops.bulk_batch_size(columns, params), 1)
+        for start in range(0, len(params), batch_size):
+            batch = params[start:start + batch_size]
+            values_sql = connection.ops.bulk_insert_sql(None, [placeholders] * len(batch))
+            cursor.execute(f'{prefix}{values_sql} {returning}', [value for values in batch for value in values])
+            pks.extend(row[0] for row in connection.ops.fetch_returned_insert_rows(cursor))
+    return pks
+
+
+def bulk_update(model, fields, rows):
+    """
+    UPDATE ``fields`` of ``model``'s rows from ``rows`` (sequences of values
+    for ``fields`` followed by the primary key), one executemany statement.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    model_fields = [model._meta.get_field(name) for name in fields]
+    qn = connection.ops.quote_name
+    sql = (f'UPDATE {qn(model._meta.db_table)} SET {", ".join(f"{qn(field.column)} = %s" for field in model_fields)} '
+           f'WHERE {qn(model._meta.pk.column)} = %s')
+    preps = _preps(model_fields, connection)
+    params = [
+        [value if prep is None else prep(value) for prep, value in zip(preps, row)] + [row[-1]]
+        for row in rows
+    ]
+    return _execute(connection, sql, params)
@@ -0,0 +1,99 @@
+"""
+Response caching for read-mostly catalogue endpoints.
+
+Entries live in the ``catalogue`` cache alias (TTL + LRU eviction come from
+the configured Django cache backend, so LocMemCache or FileBasedCache can be
+swapped in settings). Every key embeds a per-namespace version; model
+signals call ``invalidate(namespace)`` to bump it, which orphans all entries
+of that namespace at once.
+"""
+
+import hashlib
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date
+from rest_framework.response import Response
+
+CACHE_ALIAS = 'catalogue'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def stats():
+    """Hit/miss/invalidation counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def namespace_version(namespace):
+    return get_cache().get_or_set(f'ns:{namespace}', 1, None)
+
+
+def invalidate(*namespaces):
+    cache = get_cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(f'ns:{namespace}')
+        except ValueError:
+            cache.set(f'ns:{namespace}', 1, None)
+        _count('invalidations')
+
+
+def response_key(namespace, request):
+    digest = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'resp:{namespace}:{namespace_version(namespace)}:{request.accepted_media_type}:{digest}'
+
+
+class CachedListMixin:
+    """
+    Serve ``list`` from the catalogue cache. Set ``cache_namespace`` on the
+    view and invalidate that namespace from the models' signals.
+
+    ETag/Last-Modified headers of the cached response are stored with it, so
+    conditional requests are answered on a hit without touching the database.
+    """
+    cache_namespace = None
+    cache_timeout = None  # use the cache alias' TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = response_key(self.cache_namespace, request)
+        entry = cache.get(key)
+        if entry is not None:
+            _count('hits')
+            data, headers = entry
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'), last_modified=headers.get('last_modified')
+            ) or Response(data)
+            for name in ('ETag', 'Last-Modified'):
+                if name in headers:
+                    response[name] = headers[name]
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count('misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in ('ETag', 'Last-Modified') if response.has_header(name)}
+            if 'Last-Modified' in headers:
+                headers['last_modified'] = parse_http_date(headers['Last-Modified'])
+            entry = (response.data, headers)
+            if self.cache_timeout is None:
+                cache.set(key, entry)
+            else:
+                cache.set(key, entry, self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
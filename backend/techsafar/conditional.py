@@ -0,0 +1,107 @@
+"""
+ETag / Last-Modified support for list and detail views.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max, Subquery, Sum
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from products.models import ListDeletion
+
+
+def deletion_label(model):
+    return model._meta.label_lower
+
+
+def record_deletion(model):
+    """Note that a ``model`` row was deleted, for its list views' Last-Modified."""
+    now = timezone.now()
+    if not ListDeletion.objects.filter(label=deletion_label(model)).update(deleted_at=now):
+        ListDeletion.objects.get_or_create(label=deletion_label(model), defaults={'deleted_at': now})
+
+
+def last_deletion(model):
+    """The model's last deletion time, as an aggregate to run with the list's own."""
+    # Max over the rows of one value; keeps it in the validators' single query
+    return Max(Subquery(ListDeletion.objects.filter(label=deletion_label(model)).values('deleted_at')[:1]))
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs with 304 before the queryset is serialized.
+
+    Validators come from ``etag_fields``: the row's values on detail views,
+    and ``Max`` of ``last_modified_field`` plus ``Sum`` of the other fields
+    and a row count on list views. The count changes the ETag on deletes,
+    but ``Max`` does not, so Last-Modified on lists is also at least the
+    model's last deletion (``record_deletion``, called from post_delete
+    receivers and kept in the database, so every worker agrees). The
+    request path, query string, user and media type are folded into the
+    ETag, so different representations never share one.
+    """
+    last_modified_field = 'updated_at'
+    etag_fields = ('updated_at',)
+
+    def get_validator_values(self, queryset, many):
+        queryset = queryset.order_by().prefetch_related(None)
+        if many:
+            aggregates = {'count': Count('pk')}
+            for field in self.etag_fields:
+                aggregate = Max if field == self.last_modified_field else Sum
+                aggregates[field] = aggregate(field)
+            aggregates['deleted_at'] = last_deletion(queryset.model)
+            return queryset.aggregate(**aggregates)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filters = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        return queryset.filter(**filters).values(*self.etag_fields).first()
+
+    def check_not_modified(self, request, queryset, many):
+        self._validators = None
+        values = self.get_validator_values(queryset, many)
+        if values is None:
+            return None
+
+        deleted_at = values.pop('deleted_at', None)
+        signature = repr((
+            sorted(values.items()), request.get_full_path(),
+            getattr(request.user, 'pk', None), request.accepted_media_type,
+        ))
+        etag = quote_etag(hashlib.md5(signature.encode('utf-8')).hexdigest())
+        last_modified = values.get(self.last_modified_field)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        if deleted_at is not None and timestamp is not None:
+            timestamp = max(timestamp, int(deleted_at.timestamp()))
+        self._validators = (etag, timestamp)
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def add_validators(self, response):
+        if self._validators is not None and response.status_code == 200:
+            etag, timestamp = self._validators
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        not_modified = self.check_not_modified(request, queryset, many=True)
+        if not_modified is not None:
+            return not_modified
+        # ListModelMixin.list with the queryset filtered above; filtering again
+        # would repeat the filters' own queries (category lookup, search ranking)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = Response(self.get_serializer(queryset, many=True).data)
+        return self.add_validators(response)
+
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.check_not_modified(request, self.get_queryset(), many=False)
+        if not_modified is not None:
+            return not_modified
+        return self.add_validators(super().retrieve(request, *args, **kwargs))
@@ -0,0 +1,345 @@
+"""
+Synthetic marketplace data for benchmarks (manage.py seed_benchmark_data).
+
+Everything is drawn from one seeded RNG, so the same arguments always give
+the same dataset. Rows are written with plain executemany INSERTs and
+precomputed primary keys instead of model instances, which keeps a
+million-product run to minutes; derived data (category paths, product
+ratings, unread counts) is computed while generating, and the rest comes
+from the helpers the maintenance commands use.
+"""
+
+import random
+import time
+from types import SimpleNamespace
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from chat.ids import EPOCH_MS, SEQUENCE_BITS, TICK_MS, WORKER_BITS
+from chat.models import ChatParticipant, ChatRoom, Message
+from products.models import Brand, Category, Product, ProductAttribute, ProductImage, Review
+from products.search import get_search_backend
+from products.specs import ATTRIBUTE_FIELDS, attribute_rows
+from shops.models import Shop, ShopImage, ShopReview
+from techsafar.bulk import bulk_insert
+from techsafar.ratings import STARS, recompute_ratings
+from users.models import User
+
+PASSWORD = 'bench-password'
+CHUNK_SIZE = 5000
+
+CITIES = ['Lahore', 'Karachi', 'Islamabad', 'Rawalpindi', 'Faisalabad', 'Multan', 'Peshawar', 'Quetta']
+WORDS = ('fast reliable original boxed warranty sealed clean used lightly genuine imported charger '
+         'screen battery condition excellent scratches none upgraded tested delivery available '
+         'price final urgent sale cash only exchange possible contact evening').split()
+SYLLABLES = ['ka', 'ro', 'ze', 'tan', 'vi', 'lo', 'mex', 'nu', 'sa', 'dor', 'qi', 'fen']
+
+
+def _laptop_specs(rng):
+    return {
+        'RAM': f'{rng.choice([4, 8, 16, 32])} GB',
+        'Storage': f'{rng.choice([256, 512, 1024])} GB SSD',
+        'Processor': rng.choice(['Core i5', 'Core i7', 'Ryzen 5', 'Ryzen 7', 'M2']),
+        'Display': {'Size': f'{rng.choice([13.3, 14, 15.6, 17.3])} inch',
+                    'Resolution': rng.choice(['1920x1080', '2560x1600'])},
+        'Battery': f'{rng.randint(40, 99)} Wh',
+        'Weight': f'{rng.uniform(1.0, 2.8):.1f} kg',
+    }
+
+
+def _phone_specs(rng):
+    return {
+        'RAM': f'{rng.choice([3, 4, 6, 8, 12])} GB',
+        'Storage': f'{rng.choice([64, 128, 256, 512])} GB',
+        'Display': {'Size': f'{rng.uniform(5.5, 6.9):.1f} inch'},
+        'Battery': f'{rng.randint(3000, 6000)} mAh',
+        'Camera': f'{rng.choice([12, 48, 50, 64, 108])} MP',
+        'PTA Approved': rng.random() < 0.7,
+    }
+
+
+def _display_specs(rng):
+    return {
+        'Size': f'{rng.choice([24, 27, 32, 34, 43, 55])} inch',
+        'Resolution': rng.choice(['1920x1080', '2560x1440', '3840x2160']),
+        'Refresh Rate': f'{rng.choice([60, 75, 120, 144, 165])} Hz',
+        'Panel': rng.choice(['IPS', 'VA', 'OLED']),
+    }
+
+
+def _accessory_specs(rng):
+    return {
+        'Color': rng.choice(['Black', 'White', 'Silver', 'Blue']),
+        'Wireless': rng.random() < 0.5,
+        'Battery': f'{rng.randint(200, 5000)} mAh',
+        'Weight': f'{rng.randint(20, 900)} g',
+    }
+
+
+# Root categories: (name, specification generator, price range)
+ROOTS = [
+    ('Laptops', _laptop_specs, (25000, 600000)),
+    ('Mobile Phones', _phone_specs, (8000, 450000)),
+    ('Tablets', _phone_specs, (15000, 350000)),
+    ('Monitors', _display_specs, (15000, 250000)),
+    ('Televisions', _display_specs, (30000, 900000)),
+    ('Audio', _accessory_specs, (1000, 120000)),
+    ('Gaming', _accessory_specs, (5000, 250000)),
+    ('Accessories', _accessory_specs, (300, 40000)),
+]
+SUBCATEGORIES = 6
+LEAVES = 4
+
+
+def next_pk(model):
+    return (model._default_manager.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+class MarketplaceGenerator:
+    """
+    Generates a marketplace sized by ``products``. Users, shops and chat
+    rooms scale with it unless given explicitly. Usernames and slugs embed
+    the seed, so differently seeded datasets can share a database.
+    """
+
+    def __init__(self, products, seed=1, rooms=None, messages_per_room=2000, progress=None):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.products = products
+        self.sellers = max(products // 200, 5)
+        self.shop_owners = max(products // 1000, 3)
+        self.buyers = max(products // 50, 20)
+        self.rooms = max(products // 1000, 10) if rooms is None else rooms
+        if self.rooms > 1 << (WORKER_BITS + SEQUENCE_BITS):
+            raise ValueError('Too many chat rooms for unique message ids')
+        self.messages_per_room = messages_per_room
+        self.progress = progress or (lambda message: None)
+        self.now = timezone.now()
+        self.counts = {}
+
+    def generate(self):
+        if User.objects.filter(username=f'bench{self.seed}-buyer-0').exists():
+            raise ValueError(f'A dataset with seed {self.seed} already exists')
+        started = time.monotonic()
+        with transaction.atomic():
+            self.create_users()
+            self.create_categories()
+            self.create_brands()
+        self.create_products()
+        with transaction.atomic():
+            self.create_shops()
+            self.create_chat()
+        self.progress('Recomputing seller and shop ratings')
+        recompute_ratings(User, Review.objects.all(), 'product__seller')
+        recompute_ratings(Shop, ShopReview.objects.all(), 'shop')
+        self.reset_sequences()
+        self.counts['seconds'] = round(time.monotonic() - started, 1)
+        return self.counts
+
+    def past(self, days):
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+    def words(self, count):
+        return ' '.join(self.rng.choices(WORDS, k=count))
+
+    def create_users(self):
+        password = make_password(PASSWORD)
+        fields = ['id', 'username', 'password', 'email', 'first_name', 'last_name', 'user_type',
+                  'phone_number', 'address', 'is_verified', 'date_joined', 'created_at', 'updated_at']
+        self.user_ids = {}
+        rows = []
+        pk = next_pk(User)
+        for user_type, count in (('buyer', self.buyers), ('seller', self.sellers), ('shop', self.shop_owners)):
+            self.user_ids[user_type] = list(range(pk, pk + count))
+            for number in range(count):
+                joined = self.past(730)
+                username = f'bench{self.seed}-{user_type}-{number}'
+                rows.append([
+                    pk, username, password, f'{username}@example.com', username.title(), '', user_type,
+                    f'03{self.rng.randint(0, 999999999):09d}', self.rng.choice(CITIES),
+                    self.rng.random() < 0.4, joined, joined, joined,
+                ])
+                pk += 1
+        self.counts['users'] = bulk_insert(User, fields, rows)
+        self.progress(f'{len(rows)} users')
+
+    def create_categories(self):
+        fields = ['id', 'name', 'slug', 'parent', 'path', 'depth', 'created_at']
+        rows = []
+        # leaf category id -> root index, for specification templates
+        self.leaves = {}
+        pk = next_pk(Category)
+
+        def add(name, parent_id, parent_path):
+            nonlocal pk
+            path = parent_path + Category.PATH_SEGMENT.format(pk)
+            rows.append([pk, name, f'bench{self.seed}-category-{pk}', parent_id, path,
+                         path.count('/') - 1, self.now])
+            pk += 1
+            return pk - 1, path
+
+        for root_index, (root_name, _, _) in enumerate(ROOTS):
+            root_id, root_path = add(root_name, None, '')
+            for sub in range(SUBCATEGORIES):
+                sub_id, sub_path = add(f'{root_name} {sub + 1}', root_id, root_path)
+                for leaf in range(LEAVES):
+                    leaf_id, _ = add(f'{root_name} {sub + 1}.{leaf + 1}', sub_id, sub_path)
+                    self.leaves[leaf_id] = root_index
+        self.counts['categories'] = bulk_insert(Category, fields, rows)
+        self.leaf_ids = list(self.leaves)
+
+    def create_brands(self, count=120):
+        pk = next_pk(Brand)
+        self.brands = []
+        rows = []
+        for number in range(count):
+            name = ''.join(self.rng.choices(SYLLABLES, k=self.rng.randint(2, 3))).title()
+            self.brands.append(Brand(pk=pk, name=name))
+            rows.append([pk, name, f'bench{self.seed}-brand-{pk}', self.words(8), number < 10, self.now])
+            pk += 1
+        self.counts['brands'] = bulk_insert(Brand, ['id', 'name', 'slug', 'description', 'is_featured', 'created_at'], rows)
+
+    def create_products(self):
+        product_fields = [
+            'id', 'seller', 'category', 'brand', 'title', 'description', 'price', 'original_price',
+            'discount_percentage', 'condition', 'model', 'specifications', 'location', 'is_negotiable',
+            'is_available', 'is_featured', 'is_daily_essential', 'views', 'created_at', 'updated_at',
+            'rating', 'total_ratings', 'rating_sum',
+        ] + [f'rating_{star}_count' for star in STARS]
+        image_fields = ['product', 'image', 'is_primary', 'created_at']
+        review_fields = ['product', 'reviewer', 'rating', 'comment', 'created_at', 'updated_at']
+        conditions = [choice for choice, _ in Product.CONDITION_CHOICES]
+        sellers = self.user_ids['seller'] + self.user_ids['shop']
+        buyers = self.user_ids['buyer']
+        search = get_search_backend()
+        rng = self.rng
+
+        pk = next_pk(Product)
+        totals = {'products': 0, 'product_images': 0, 'reviews': 0, 'attributes': 0}
+        started = time.monotonic()
+        for chunk_start in range(0, self.products, CHUNK_SIZE):
+            products, images, reviews, attributes, documents = [], [], [], [], []
+            for _ in range(min(CHUNK_SIZE, self.products - chunk_start)):
+                category_id = rng.choice(self.leaf_ids)
+                root_name, make_specs, (low, high) = ROOTS[self.leaves[category_id]]
+                brand = rng.choice(self.brands)
+                model = f'{rng.choice(SYLLABLES).upper()}-{rng.randint(100, 9999)}'
+                specifications = make_specs(rng)
+                price = Decimal(int(low * (high / low) ** rng.random()))
+                original_price = discount = None
+                if rng.random() < 0.3:
+                    original_price = (price * Decimal(rng.uniform(1.05, 1.6))).quantize(Decimal('1'))
+                    discount = int((original_price - price) / original_price * 100)
+                created_at = self.past(365)
+
+                stars = [min(5, max(1, round(rng.gauss(4, 1)))) for _ in range(min(int(rng.expovariate(0.6)), 20))]
+                for reviewer, rating in zip(rng.sample(buyers, min(len(stars), len(buyers))), stars):
+                    reviewed_at = created_at + timedelta(seconds=rng.randint(0, 30 * 86400))
+                    reviews.append([pk, reviewer, rating, self.words(12), reviewed_at, reviewed_at])
+                star_counts = [stars.count(star) for star in STARS]
+
+                title = f'{brand.name} {root_name.rstrip("s")} {model}'
+                description = self.words(rng.randint(15, 60))
+                products.append([
+                    pk, rng.choice(sellers), category_id, brand.pk, title, description, price, original_price,
+                    discount or 0, rng.choice(conditions), model, specifications, rng.choice(CITIES),
+                    rng.random() < 0.7, rng.random() < 0.9, rng.random() < 0.01, rng.random() < 0.02,
+                    int(rng.paretovariate(1.2)) - 1, created_at, created_at,
+                    round(sum(stars) / len(stars), 2) if stars else 0, len(stars), sum(stars),
+                ] + star_counts)
+                for number in range(rng.randint(1, 4)):
+                    images.append([pk, f'product_images/bench/{pk}-{number}.jpg', number == 0, created_at])
+                documents.append(SimpleNamespace(pk=pk, title=title, description=description, brand=brand,
+                                                 brand_id=brand.pk, model=model, specifications=specifications))
+                attributes.extend(attribute_rows(pk, specifications))
+                pk += 1
+
+            with transaction.atomic():
+                totals['products'] += bulk_insert(Product, product_fields, products)
+                totals['product_images'] += bulk_insert(ProductImage, image_fields, images)
+                totals['reviews'] += bulk_insert(Review, review_fields, reviews)
+                totals['attributes'] += bulk_insert(ProductAttribute, ATTRIBUTE_FIELDS, attributes)
+                search.index_many(documents)
+            done = totals['products']
+            self.progress(f'{done}/{self.products} products ({done / (time.monotonic() - started):.0f}/s)')
+        self.counts.update(totals)
+
+    def create_shops(self):
+        pk = next_pk(Shop)
+        shops, images, reviews = [], [], []
+        hours = {day: '10:00-21:00' for day in ('mon', 'tue', 'wed', 'thu', 'fri', 'sat')}
+        for owner in self.user_ids['shop']:
+            created_at = self.past(730)
+            name = f'{"".join(self.rng.choices(SYLLABLES, k=3)).title()} Electronics'
+            shops.append([pk, owner, name, self.words(30), self.rng.choice(CITIES), '0421234567',
+                          f'shop{pk}@example.com', hours, self.rng.random() < 0.5, created_at, created_at])
+            for number in range(2):
+                images.append([pk, f'shop_images/bench/{pk}-{number}.jpg', number == 0, created_at])
+            for reviewer in self.rng.sample(self.user_ids['buyer'], min(self.rng.randint(0, 10), self.buyers)):
+                reviews.append([pk, reviewer, self.rng.randint(1, 5), self.words(10), created_at, created_at])
+            pk += 1
+        self.counts['shops'] = bulk_insert(Shop, [
+            'id', 'owner', 'name', 'description', 'address', 'phone_number', 'email', 'business_hours',
+            'is_verified', 'created_at', 'updated_at',
+        ], shops)
+        self.counts['shop_images'] = bulk_insert(ShopImage, ['shop', 'image', 'is_primary', 'created_at'], images)
+        self.counts['shop_reviews'] = bulk_insert(
+            ShopReview, ['shop', 'reviewer', 'rating', 'comment', 'created_at', 'updated_at'], reviews
+        )
+
+    def create_chat(self):
+        """
+        Rooms between a buyer and a seller with ``messages_per_room`` messages
+        each over the last 180 days. Message ids follow chat.ids, with the
+        room number in place of worker and sequence bits so they stay unique.
+        """
+        room_pk = next_pk(ChatRoom)
+        sellers = self.user_ids['seller'] + self.user_ids['shop']
+        span_ticks = 180 * 86400 * 1000 // TICK_MS
+        now_tick = (int(self.now.timestamp() * 1000) - EPOCH_MS) // TICK_MS
+        rooms, participants, total = [], [], 0
+        for number in range(self.rooms):
+            buyer, seller = self.rng.choice(self.user_ids['buyer']), self.rng.choice(sellers)
+            count = self.messages_per_room
+            ticks = sorted(self.rng.sample(range(now_tick - span_ticks, now_tick), count)) if count else []
+            unread = self.rng.randint(0, min(5, count))
+            messages = []
+            for position, tick in enumerate(ticks):
+                created_at = self.now - timedelta(milliseconds=(now_tick - tick) * TICK_MS)
+                message_id = (tick << (WORKER_BITS + SEQUENCE_BITS)) | number
+                sender = seller if self.rng.random() < 0.5 or position >= count - unread else buyer
+                messages.append([message_id, room_pk, sender, self.words(self.rng.randint(3, 25)),
+                                 position < count - unread, created_at])
+            created_at = messages[0][5] if messages else self.now
+            updated_at = messages[-1][5] if messages else self.now
+            rooms.append([room_pk, messages[-1][0] if messages else None, created_at, updated_at])
+            participants.append([room_pk, buyer, unread])
+            participants.append([room_pk, seller, 0])
+            # Rooms first: messages reference them and last_message is set afterwards
+            bulk_insert(ChatRoom, ['id', 'created_at', 'updated_at'], [rooms[-1][:1] + rooms[-1][2:]])
+            total += bulk_insert(Message, ['id', 'chat_room', 'sender', 'content', 'is_read', 'created_at'], messages)
+            room_pk += 1
+        ChatRoom.objects.bulk_update(
+            [ChatRoom(pk=pk, last_message_id=last_id) for pk, last_id, _, _ in rooms if last_id], ['last_message'],
+            batch_size=500,
+        )
+        self.counts['chat_rooms'] = len(rooms)
+        self.counts['chat_participants'] = bulk_insert(ChatParticipant, ['chat_room', 'user', 'unread_count'], participants)
+        self.counts['messages'] = total
+        self.progress(f'{len(rooms)} chat rooms, {total} messages')
+
+    def reset_sequences(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        models = [User, Category, Brand, Product, ProductImage, Review, ProductAttribute,
+                  Shop, ShopImage, ShopReview, ChatRoom, ChatParticipant, Message]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
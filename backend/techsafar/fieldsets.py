@@ -0,0 +1,50 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?expand=`` for API serializers.
+"""
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _param_set(request, name):
+    value = request.query_params.get(name, '')
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def requested_fields(serializer_class, request):
+    """
+    Names of the fields ``serializer_class`` will render for ``request``.
+
+    ``Meta.expandable_fields`` are left out unless named in ``?expand=``;
+    ``?fields=`` narrows the result further (``id`` is always kept).
+    Views use this to skip joins and columns nobody asked for.
+    """
+    meta = serializer_class.Meta
+    declared = list(meta.fields)
+    expandable = set(getattr(meta, 'expandable_fields', ()))
+    if request is None:
+        return {name for name in declared if name not in expandable}
+
+    expand = _param_set(request, EXPAND_PARAM)
+    selected = {name for name in declared if name not in expandable or name in expand}
+    only = _param_set(request, FIELDS_PARAM)
+    if only:
+        selected &= only | expand | {'id'}
+    return selected
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin that drops fields the client did not ask for.
+
+    Only applies to the top-level serializer built by the view (the one
+    given the request in its context); nested serializers are untouched.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self._context.get('request')
+        if request is None:
+            return fields
+        keep = requested_fields(type(self), request)
+        return {name: field for name, field in fields.items() if name in keep}
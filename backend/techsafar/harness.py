@@ -0,0 +1,18 @@
+"""
+Setup shared by the commands that call views in-process and count or
+explain their queries (check_query_budgets, check_query_plans,
+run_benchmarks).
+"""
+
+from django.conf import settings
+
+
+def request_host():
+    """A host ALLOWED_HOSTS accepts; 'testserver' is not, and build_absolute_uri() would refuse it."""
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+
+
+def warm_up(connection):
+    # Backend feature probes (e.g. SQLite's JSON support) run on first use; not the views' queries
+    connection.ensure_connection()
+    connection.features.supports_json_field
@@ -0,0 +1,150 @@
+"""
+Background image pipeline: resized, metadata-free variants of uploads.
+
+Uploads are stored inside the request, re-encoded only if they carry
+metadata (``strip_metadata``); ``schedule`` then hands the rows to a
+thread pool (after the transaction commits) which writes one re-encoded
+file per variant and records their storage names in the row's ``variants``
+JSON field. ``delete_variants`` removes those files with their row.
+"""
+
+import atexit
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'ASYNC': True,
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    # name -> bounding box; aspect ratio is preserved
+    'VARIANTS': {'thumbnail': (160, 160), 'card': (480, 480), 'full': (1600, 1600)},
+}
+config = {**DEFAULTS, **getattr(settings, 'IMAGE_PIPELINE', {})}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config['WORKERS'], thread_name_prefix='images')
+        atexit.register(_executor.shutdown, wait=True)
+    return _executor
+
+
+def strip_metadata(upload):
+    """
+    ``upload`` without EXIF (camera, GPS position) or XMP metadata, as a new
+    file in the same format with the orientation applied; unchanged if it
+    has none, so clean uploads are not re-encoded.
+    """
+    image = Image.open(upload)
+    if not image.getexif() and not {'exif', 'xmp', 'XML:com.adobe.xmp'} & set(image.info):
+        upload.seek(0)
+        return upload
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    # Only the colour profile is carried over
+    image.save(buffer, image_format, quality=95, icc_profile=image.info.get('icc_profile'))
+    return ContentFile(buffer.getvalue(), name=upload.name)
+
+
+def render_variants(name):
+    """
+    Write every configured variant of the stored image ``name`` and return
+    ``{variant: storage name}``. EXIF and other metadata are dropped because
+    the pixels are re-encoded without them (orientation is applied first).
+    """
+    extension = config['FORMAT'].lower()
+    base = os.path.splitext(name)[0]
+    with default_storage.open(name, 'rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    variants = {}
+    for variant, size in config['VARIANTS'].items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, config['FORMAT'], quality=config['QUALITY'], method=4)
+        target = f'variants/{base}_{variant}.{extension}'
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        variants[variant] = default_storage.save(target, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def process(model, pk):
+    try:
+        name = model._default_manager.filter(pk=pk).values_list('image', flat=True).first()
+        if name:
+            variants = render_variants(name)
+            if not model._default_manager.filter(pk=pk).update(variants=variants):
+                # Deleted while rendering; nothing will refer to the files
+                for variant_name in variants.values():
+                    default_storage.delete(variant_name)
+            return True
+    except Exception:
+        logger.exception('Failed to process %s %s', model.__name__, pk)
+    return False
+
+
+def _process_in_worker(model, pk):
+    # Pool threads are reused, so manage their connections per job
+    close_old_connections()
+    try:
+        process(model, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(model, pks):
+    """Process ``pks`` of ``model`` in the pool once the current transaction commits."""
+    pks = list(pks)
+
+    def submit():
+        for pk in pks:
+            if config['ASYNC']:
+                get_executor().submit(_process_in_worker, model, pk)
+            else:
+                process(model, pk)
+
+    transaction.on_commit(submit)
+
+
+def delete_variants(image):
+    """Delete the variant files of ``image`` once the current transaction commits."""
+    names = list((image.variants or {}).values())
+
+    def delete():
+        for name in names:
+            default_storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+def variant_urls(image, request=None):
+    """Absolute URLs of ``image.variants``, falling back to the original upload."""
+    names = image.variants or {}
+    urls = {}
+    for variant in config['VARIANTS']:
+        name = names.get(variant) or image.image.name
+        url = default_storage.url(name) if name else None
+        urls[variant] = request.build_absolute_uri(url) if request and url else url
+    return urls
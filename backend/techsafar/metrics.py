@@ -0,0 +1,313 @@
+"""
+Request and WebSocket metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request and the SQL it runs, per URL
+route, and flags N+1 patterns (the same statement repeated within one
+request) and slow queries. ``WebSocketMetricsMiddleware`` wraps the ASGI
+websocket application. Everything is aggregated in this process' memory and
+served by ``metrics_view``; with several workers, scrape each one.
+"""
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+CONFIG = {
+    'ENABLED': True,
+    'SLOW_QUERY_MS': 100,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    # (route, statement) pairs remembered so each N+1 is logged once
+    'N_PLUS_ONE_REPORTED': 1000,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+    **getattr(settings, 'PERF_METRICS', {}),
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f'{self.name}{_labels(self.label_names, labels)} {value}' for labels, value in sorted(values.items())
+        ]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, the last one for +Inf, then the sum
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def render(self):
+        with self._lock:
+            values = {labels: list(entry) for labels, entry in self._values.items()}
+        lines = self.header()
+        for labels, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), entry):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {entry[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests.', ['route', 'method', 'status'])
+http_duration = Histogram('http_request_duration_seconds', 'Total request latency.', ['route'])
+http_queries = Histogram('http_request_queries', 'SQL queries per request.', ['route'], QUERY_BUCKETS)
+http_query_duration = Histogram('http_request_query_seconds', 'Time spent in SQL per request.', ['route'])
+http_serialization = Histogram(
+    'http_response_render_seconds', 'Time spent rendering (serializing) template and DRF responses.', ['route']
+)
+http_response_size = Histogram('http_response_bytes', 'Response body size.', ['route'], SIZE_BUCKETS)
+n_plus_one = Counter('http_n_plus_one_total', 'Requests repeating one SQL statement N_PLUS_ONE_THRESHOLD+ times.',
+                     ['route'])
+slow_queries = Counter('db_slow_queries_total', 'Queries slower than SLOW_QUERY_MS.', ['route'])
+
+websocket_connections = Counter('websocket_connections_total', 'WebSocket handshakes.', ['outcome'])
+websocket_active = Gauge('websocket_active_connections', 'Open WebSocket connections.')
+websocket_messages = Counter('websocket_messages_total', 'WebSocket frames.', ['direction'])
+websocket_duration = Histogram('websocket_connection_seconds', 'WebSocket connection lifetime.',
+                               buckets=(1, 10, 60, 300, 1800, 3600, 14400))
+
+
+class QueryTracker:
+    """Execute wrapper collecting one request's queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            # Parameters are separate, so repeats of one statement share its text
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+            if elapsed * 1000 >= CONFIG['SLOW_QUERY_MS']:
+                self.slow.append((elapsed, sql))
+
+
+# Placeholder lists of any length, e.g. pk__in=[...]
+PLACEHOLDERS_RE = re.compile(r'%s(?:, %s)+')
+
+
+def fingerprint(sql):
+    return PLACEHOLDERS_RE.sub('%s, ...', sql)
+
+
+class ReportedStatements:
+    """The most recently logged (route, fingerprint) pairs, at most ``size``."""
+
+    def __init__(self, size):
+        self.size = size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_time(self, key):
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return False
+            self._seen[key] = True
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+            return True
+
+
+# N+1 statements already logged, to log each once (while remembered)
+_reported = ReportedStatements(CONFIG['N_PLUS_ONE_REPORTED'])
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL count and time, render time and response size per
+    URL route. Goes first in MIDDLEWARE so the latency covers the others.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not CONFIG['ENABLED']:
+            return self.get_response(request)
+        tracker = QueryTracker()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else '<unmatched>'
+        http_requests.inc(route, request.method, response.status_code)
+        http_duration.observe(elapsed, route)
+        http_queries.observe(tracker.count, route)
+        http_query_duration.observe(tracker.duration, route)
+        if hasattr(request, '_render_seconds'):
+            http_serialization.observe(request._render_seconds, route)
+        if not response.streaming:
+            http_response_size.observe(len(response.content), route)
+        self.report(route, tracker)
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, route, tracker):
+        for elapsed, sql in tracker.slow:
+            slow_queries.inc(route)
+            logger.warning('Slow query (%.0f ms) on %s: %s', elapsed * 1000, route, sql[:500])
+        repeated = [sql for sql, count in tracker.statements.items() if count >= CONFIG['N_PLUS_ONE_THRESHOLD']]
+        if repeated:
+            n_plus_one.inc(route)
+            for sql in repeated:
+                if _reported.first_time((route, fingerprint(sql))):
+                    logger.warning('Possible N+1 on %s, %d times: %s', route, tracker.statements[sql], sql[:500])
+
+
+class WebSocketMetricsMiddleware:
+    """ASGI middleware counting handshakes, frames and open connections."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket' or not CONFIG['ENABLED']:
+            return await self.inner(scope, receive, send)
+        state = {'accepted': None, 'closed': False}
+
+        async def counting_receive():
+            message = await receive()
+            if message['type'] == 'websocket.receive':
+                websocket_messages.inc('in')
+            return message
+
+        async def counting_send(message):
+            if message['type'] == 'websocket.accept':
+                state['accepted'] = time.monotonic()
+                websocket_connections.inc('accepted')
+                websocket_active.inc()
+            elif message['type'] == 'websocket.send':
+                websocket_messages.inc('out')
+            elif message['type'] == 'websocket.close' and state['accepted'] is None and not state['closed']:
+                state['closed'] = True
+                websocket_connections.inc('rejected')
+            await send(message)
+
+        try:
+            return await self.inner(scope, counting_receive, counting_send)
+        finally:
+            if state['accepted'] is not None:
+                websocket_active.dec()
+                websocket_duration.observe(time.monotonic() - state['accepted'])
+
+
+def _stats_lines(name, documentation, stats, label):
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} counter']
+    return lines + [f'{name}{{{label}="{_escape(key)}"}} {value}' for key, value in sorted(stats.items())]
+
+
+def render():
+    from users.authentication import user_cache
+    from .cache import stats as catalogue_stats
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_stats_lines('catalogue_cache_events_total', 'Catalogue response cache events.',
+                              catalogue_stats(), 'event'))
+    user_stats = user_cache.stats()
+    size = user_stats.pop('size')
+    lines.extend(_stats_lines('auth_user_cache_events_total', 'Authentication user cache events.',
+                              user_stats, 'event'))
+    lines.extend(['# HELP auth_user_cache_size Users in the authentication cache.',
+                  '# TYPE auth_user_cache_size gauge', f'auth_user_cache_size {size}'])
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    # Metrics are for the scraper only; others get a plain 404
+    if request.META.get('REMOTE_ADDR') not in CONFIG['ALLOWED_IPS']:
+        raise Http404
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
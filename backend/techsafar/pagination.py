@@ -0,0 +1,164 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek-based pagination: each page is fetched with ``WHERE (key, id) > cursor``
+    on an indexed ordering instead of ``OFFSET``, and no total count is run,
+    so page N costs the same as page 1.
+
+    The ordering is the view's ``?ordering=`` when it names one of
+    ``ordering_fields``, otherwise ``view.keyset_ordering`` (or
+    ``self.ordering``), always followed by ``id`` as a tie-breaker.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, view):
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        param = request.query_params.get(api_settings.ORDERING_PARAM)
+        if param:
+            field = param.split(',')[0].strip()
+            if field.lstrip('-') in (getattr(view, 'ordering_fields', None) or ()):
+                ordering = field
+        if ordering.lstrip('-') == 'id':
+            return [ordering]
+        return [ordering, '-id' if ordering.startswith('-') else 'id']
+
+    def decode_cursor(self, request, keys, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if data['k'] != keys or len(data['v']) != len(keys):
+                raise ValueError
+            # Checked here, so a tampered value is a 404 rather than an error in the query
+            values = []
+            for key, value in zip(keys, data['v']):
+                if value is None or isinstance(value, (list, dict)):
+                    raise ValueError
+                values.append(model._meta.get_field(key.lstrip('-')).to_python(value))
+            return values, bool(data['r'])
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, keys, obj, reverse):
+        values = [_jsonable(getattr(obj, key.lstrip('-'))) for key in keys]
+        data = json.dumps({'k': keys, 'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def seek_filter(self, keys, values):
+        # Row-value comparison (k1, k2) > (v1, v2) spelled out for every backend
+        condition = Q()
+        equal = Q()
+        for key, value in zip(keys, values):
+            field = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def fetch(self, queryset, order, values, limit):
+        """Up to ``limit`` rows in ``order`` after the cursor ``values`` (None: from the start)."""
+        queryset = queryset.order_by(*order)
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(order, values))
+        return list(queryset[:limit])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        self.keys = self.get_ordering(request, view)
+        values, self.reverse = self.decode_cursor(request, self.keys, queryset.model)
+
+        order = self.keys
+        if self.reverse:
+            order = [key[1:] if key.startswith('-') else f'-{key}' for key in self.keys]
+
+        page = self.fetch(queryset, order, values, self.page_size + 1)
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.keys, self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.keys, self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetOrPageNumberPagination(BasePagination):
+    """
+    Page numbers by default, keyset pagination once the client opts in with
+    ``?cursor=`` (an empty value starts from the first page).
+    """
+    page_number_class = PageNumberPagination
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.active = self.keyset_class()
+        else:
+            self.active = self.page_number_class()
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
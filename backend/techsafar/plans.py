@@ -0,0 +1,64 @@
+"""
+Query plan checks for ``manage.py check_query_plans``.
+
+``explain()`` runs EXPLAIN on one statement and returns what the plan
+contains of ``'scan'`` (reading a whole table without an index) and
+``'sort'`` (ordering rows no index delivers in order). Index-only scans of a
+whole table, as used for unfiltered counts, are not reported. SQLite's
+planner works from the schema alone until ANALYZE has run; PostgreSQL is
+asked to plan with sequential scans and sorts disabled, so either appears
+only where no index can serve the query, whatever the table sizes.
+"""
+
+import json
+import re
+
+from django.db import transaction
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)$')
+MAIN_TABLE = re.compile(r'\bFROM "?(\w+)"?')
+
+
+def main_table(sql):
+    match = MAIN_TABLE.search(sql)
+    return match.group(1) if match else None
+
+
+def sqlite_problems(details):
+    problems = []
+    for detail in details:
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            problems.append(('scan', match.group(1)))
+        elif detail.startswith('USE TEMP B-TREE'):
+            problems.append(('sort', detail))
+    return problems
+
+
+def postgresql_problems(node):
+    problems = []
+    if node['Node Type'] == 'Seq Scan':
+        problems.append(('scan', node['Relation Name']))
+    elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+        problems.append(('sort', ', '.join(node.get('Sort Key', []))))
+    for child in node.get('Plans', []):
+        problems.extend(postgresql_problems(child))
+    return problems
+
+
+def explain(connection, sql, params):
+    """(kind, detail) pairs for the problems in the plan of ``sql``, plus the raw plan."""
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+            return sqlite_problems(details), details
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return postgresql_problems(plan[0]['Plan']), plan
+    raise NotImplementedError(f'No plan check for {connection.vendor}')
@@ -0,0 +1,101 @@
+"""
+Stored rating aggregates shared by products, shops and sellers.
+"""
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Round
+
+STARS = range(1, 6)
+
+
+class RatingAggregate(models.Model):
+    """
+    Count, sum, mean and 1-5 star histogram of the reviews left on an object.
+
+    The columns are only ever changed through ``apply_rating_change`` (atomic
+    ``F()`` updates) or ``recompute_ratings``, never by saving the instance.
+    """
+    rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    total_ratings = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in STARS}
+
+
+def _mean():
+    return Case(
+        When(total_ratings=0, then=Value(0.0)),
+        default=Round(F('rating_sum') * 1.0 / F('total_ratings'), 2),
+        output_field=FloatField(),
+    )
+
+
+def apply_rating_change(model, pk, old=None, new=None):
+    """
+    Move one review's contribution on ``model`` row ``pk`` from ``old`` to
+    ``new`` stars. Pass ``old=None`` for a new review and ``new=None`` for a
+    deleted one.
+    """
+    if pk is None or old == new:
+        return
+    changes = {}
+    delta_count = 0
+    delta_sum = 0
+    if old is not None:
+        delta_count -= 1
+        delta_sum -= old
+        if old in STARS:
+            changes[f'rating_{old}_count'] = F(f'rating_{old}_count') - 1
+    if new is not None:
+        delta_count += 1
+        delta_sum += new
+        if new in STARS:
+            changes[f'rating_{new}_count'] = F(f'rating_{new}_count') + 1
+    changes['total_ratings'] = F('total_ratings') + delta_count
+    changes['rating_sum'] = F('rating_sum') + delta_sum
+
+    rows = model._default_manager.filter(pk=pk)
+    with transaction.atomic():
+        rows.update(**changes)
+        rows.update(rating=_mean())
+
+
+def recompute_ratings(model, reviews, target_field, batch_size=1000):
+    """
+    Rebuild the aggregates of every ``model`` row from the ``reviews``
+    queryset, grouping reviews by ``target_field`` (e.g. ``'shop'`` or
+    ``'product__seller'``). Returns the number of rows that have reviews.
+    """
+    star_counts = {
+        f'rating_{star}_count': Count('pk', filter=Q(rating=star)) for star in STARS
+    }
+    totals = (reviews.order_by().values(target_field)
+              .annotate(total_ratings=Count('pk'), rating_sum=Sum('rating'), **star_counts))
+
+    fields = ['rating', 'total_ratings', 'rating_sum'] + list(star_counts)
+    rated = 0
+    with transaction.atomic():
+        model._default_manager.update(**{field: 0 for field in fields})
+        batch = []
+        for row in totals.iterator():
+            obj = model(pk=row.pop(target_field), **row)
+            obj.rating = round(obj.rating_sum / obj.total_ratings, 2)
+            batch.append(obj)
+            rated += 1
+            if len(batch) >= batch_size:
+                model._default_manager.bulk_update(batch, fields)
+                batch = []
+        if batch:
+            model._default_manager.bulk_update(batch, fields)
+    return rated
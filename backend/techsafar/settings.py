@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'techsafar.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -118,7 +119,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -138,15 +139,124 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Request/WebSocket metrics, served at /metrics/ to ALLOWED_IPS (techsafar.metrics)
+PERF_METRICS = {
+    'ENABLED': True,
+    'SLOW_QUERY_MS': 100,
+    'N_PLUS_ONE_THRESHOLD': 5,  # identical statements within one request
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Per-process cache of users behind access tokens (users.authentication)
+AUTH_USER_CACHE = {
+    'MAX_USERS': 10000,
+    'TTL': 300,  # seconds another process' changes to a user can go unseen
+}
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
 
-# Channels settings
-CHANNEL_LAYERS = {
+# Caches; 'catalogue' holds cached catalogue responses (see techsafar.cache).
+# LocMemCache is per process with LRU eviction; point it at FileBasedCache
+# (or a shared cache) when running several workers.
+CACHES = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogue': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogue',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Upload variants (see techsafar.images)
+IMAGE_PIPELINE = {
+    'WORKERS': 2,
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'VARIANTS': {'thumbnail': (160, 160), 'card': (480, 480), 'full': (1600, 1600)},
+}
+
+# Product view counter (write-behind, see products.counters)
+VIEW_COUNTER = {
+    'FLUSH_INTERVAL': 10,  # seconds between batched writes
+    'MAX_PENDING': 1000,  # distinct products buffered before an early flush
+    'SPOOL_PATH': os.path.join(BASE_DIR, 'view_counts.spool'),
+}
+
+# WebSocket chat messages are written behind (see chat.buffer)
+CHAT_BUFFER = {
+    'MAX_DELAY': 0.05,  # seconds a message may wait for its batch
+    'MAX_BATCH': 500,
+    'RETRY_DELAY': 1,  # seconds before a failed batch is written again
+    'SHUTDOWN_TIMEOUT': 5,  # seconds to wait on exit for the batch being written
+    'SPOOL_PATH': os.path.join(BASE_DIR, 'chat_messages.spool'),
+}
+# 0-63, unique per process that writes chat messages (see chat.ids): every
+# Daphne process and every WSGI worker, since HTTP posts messages too. Required
+# outside DEBUG, where the ASGI and WSGI apps refuse to start without it; run
+# WSGI servers one process per id (e.g. gunicorn --workers 1 per CHAT_WORKER_ID)
+CHAT_WORKER_ID = os.environ.get('CHAT_WORKER_ID', '0' if DEBUG else None)
+# Messages missed while disconnected, replayed on reconnect with ?last_id=
+CHAT_REPLAY = {
+    'BATCH_SIZE': 100,
+    'MAX_MESSAGES': 1000,  # beyond this the client must refetch the history
+}
+
+# Bulk product import (see products.imports). The HTTP endpoint imports within
+# the request at about 1,000 rows/s; bigger files go through manage.py import_products
+PRODUCT_IMPORT = {
+    'MAX_UPLOAD_SIZE': 2 * 1024 * 1024,  # bytes, about 7,000 rows
+}
+
+# Product search (see products.search); use DatabaseBackend on non-SQLite databases
+PRODUCT_SEARCH = {
+    'BACKEND': 'products.search.SQLiteFTSBackend',
+}
+
+# "Similar products" vectors (see products.similarity), about 1.2 KB per product
+# in every worker. Built only by manage.py rebuild_similarity_index, which also
+# empties the change journal; run it nightly with rebuild_price_stats
+PRODUCT_SIMILARITY = {
+    'PATH': os.path.join(BASE_DIR, 'product_similarity.npz'),
+    'TEXT_DIMENSIONS': 256,
+    'SPEC_DIMENSIONS': 32,
+    'WEIGHTS': {'text': 0.6, 'specs': 0.25, 'price': 0.15},
+    'SYNC_INTERVAL': 1,  # seconds between checks for changes saved by other workers
+    'SYNC_BATCH': 1000,  # changed products a request reloads at most
+}
+
+# Market price statistics (see products.pricing); kept up to date on save,
+# recount nightly with manage.py rebuild_price_stats (and rebuild_similarity_index)
+PRICE_STATS = {
+    'RESOLUTION': 0.02,  # relative width of the price buckets percentiles are read from
+    'MIN_LISTINGS': 5,  # fewer and the next broader group is used
+}
+
+# Chat messages older than this move to compressed segments (manage.py archive_messages)
+CHAT_ARCHIVE = {
+    'AFTER_DAYS': 90,
+    'SEGMENT_SIZE': 500,  # messages per segment
+}
+
+# Channels settings. With several Daphne workers, run `manage.py run_channel_broker`
+# and point CHANNEL_BROKER at it (unix:/path/to.sock or host:port)
+CHANNEL_BROKER = os.environ.get('CHANNEL_BROKER')
+if CHANNEL_BROKER:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chat.layers.BrokerChannelLayer',
+            'CONFIG': {'address': CHANNEL_BROKER},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
     }
-} 
\ No newline at end of file
@@ -8,4 +8,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'techsafar.settings')
 
-application = get_wsgi_application() 
\ No newline at end of file
+application = get_wsgi_application()
+
+from chat.ids import message_ids  # noqa: E402
+
+# MessageCreateView assigns message ids too; fail now rather than on the first POST
+message_ids.worker_id
@@ -0,0 +1,122 @@
+"""
+JWT authentication without a users query per request.
+
+Access tokens are signed, so the user id claim can be trusted as is; the
+``User`` row behind it comes from a bounded per-process LRU cache. Saving or
+deleting a user evicts its entry (see users.signals), which covers
+deactivation, verification and password changes made in this process. Other
+processes pick such changes up after AUTH_USER_CACHE['TTL'] seconds; code
+that changes users with ``QuerySet.update()`` should call
+``user_cache.discard()`` itself.
+"""
+
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+CONFIG = {'MAX_USERS': 10000, 'TTL': 300, **getattr(settings, 'AUTH_USER_CACHE', {})}
+
+
+class UserCache:
+    """
+    Thread-safe LRU of ``User`` instances keyed by primary key. Callers get a
+    shallow copy, so a request changing ``request.user`` never touches the
+    shared instance.
+    """
+
+    def __init__(self, max_users=10000, ttl=300):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()  # pk -> (expires, user)
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def get(self, pk):
+        with self._lock:
+            entry = self._users.get(pk)
+            if entry is None or entry[0] < time.monotonic():
+                self._users.pop(pk, None)
+                self._stats['misses'] += 1
+                return None
+            self._users.move_to_end(pk)
+            self._stats['hits'] += 1
+            return copy.copy(entry[1])
+
+    def set(self, user):
+        with self._lock:
+            self._users[user.pk] = (time.monotonic() + self.ttl, copy.copy(user))
+            self._users.move_to_end(user.pk)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def discard(self, pk):
+        with self._lock:
+            if self._users.pop(pk, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'size': len(self._users)}
+
+
+user_cache = UserCache(max_users=CONFIG['MAX_USERS'], ttl=CONFIG['TTL'])
+
+
+def check_user(user, validated_token):
+    """The checks simplejwt runs on a freshly loaded user, applied to cached ones too."""
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+
+
+def cached_token_user(validated_token):
+    """The token's user if it is cached, without touching the database; None otherwise."""
+    if api_settings.USER_ID_FIELD != 'id':
+        return None
+    user = user_cache.get(token_user_id(validated_token))
+    if user is not None:
+        check_user(user, validated_token)
+    return user
+
+
+def get_token_user(validated_token, user_model):
+    """The active user of a validated access token, from the cache when possible."""
+    user = cached_token_user(validated_token)
+    if user is not None:
+        return user
+    try:
+        user = user_model.objects.get(**{api_settings.USER_ID_FIELD: token_user_id(validated_token)})
+    except user_model.DoesNotExist:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    check_user(user, validated_token)
+    user_cache.set(user)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` resolving users through ``user_cache``."""
+
+    def get_user(self, validated_token):
+        return get_token_user(validated_token, self.user_model)
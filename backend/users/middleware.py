@@ -0,0 +1,89 @@
+"""
+JWT authentication for WebSocket connections.
+
+Browsers cannot set an Authorization header on a WebSocket, so the access
+token comes either as a subprotocol pair (``new WebSocket(url, ['access_token',
+token])``) or, for clients that cannot, as ``?token=`` in the URL, which ends
+up in access logs. The token is verified from its signature alone and the
+user comes from users.authentication's cache; concurrent connections of a
+user whose row is not cached share a single query.
+"""
+
+import asyncio
+import copy
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import cached_token_user, check_user, get_token_user, token_user_id
+
+TOKEN_SUBPROTOCOL = 'access_token'
+
+
+def get_raw_token(scope):
+    """The token and the subprotocol to accept it with (None for the query string)."""
+    subprotocols = scope.get('subprotocols') or []
+    if TOKEN_SUBPROTOCOL in subprotocols:
+        position = subprotocols.index(TOKEN_SUBPROTOCOL)
+        if position + 1 < len(subprotocols):
+            return subprotocols[position + 1], TOKEN_SUBPROTOCOL
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return (token[0], None) if token else (None, None)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Sets ``scope['user']`` from a SimpleJWT access token, or to AnonymousUser.
+    When the token came as a subprotocol, ``scope['auth_subprotocol']`` holds
+    the name consumers must accept the connection with.
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        # user id -> load in progress, shared by concurrent connections
+        self._loading = {}
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, subprotocol = get_raw_token(scope)
+        scope['user'] = await self.resolve_user(raw_token) if raw_token else AnonymousUser()
+        scope['auth_subprotocol'] = subprotocol
+        return await self.inner(scope, receive, send)
+
+    async def resolve_user(self, raw_token):
+        try:
+            token = AccessToken(raw_token)
+            user = cached_token_user(token)
+            if user is None:
+                user = await self.load_user(token)
+        except (TokenError, InvalidToken, AuthenticationFailed):
+            return AnonymousUser()
+        return user
+
+    async def load_user(self, token):
+        user_id = token_user_id(token)
+        load = self._loading.get(user_id)
+        shared = load is not None
+        if not shared:
+            load = asyncio.ensure_future(database_sync_to_async(get_token_user)(token, get_user_model()))
+            self._loading[user_id] = load
+            load.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        try:
+            user = await asyncio.shield(load)
+        except AuthenticationFailed:
+            if not shared:
+                raise
+            # Checked against the other connection's token (e.g. one issued before a password change)
+            return await database_sync_to_async(get_token_user)(token, get_user_model())
+        cached = cached_token_user(token)
+        if cached is not None:
+            return cached
+        # The load was checked against the token that started it, not necessarily this one
+        user = copy.copy(user)
+        check_user(user, token)
+        return user
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from techsafar.ratings import RatingAggregate
 
-class User(AbstractUser):
+class User(AbstractUser, RatingAggregate):
     USER_TYPE_CHOICES = (
         ('buyer', 'Buyer'),
         ('seller', 'Seller'),
@@ -12,8 +13,6 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True)
     address = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
-    rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    total_ratings = models.IntegerField(default=0)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
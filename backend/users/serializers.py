@@ -31,7 +31,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'email', 'user_type', 'phone_number', 
                  'address', 'profile_picture', 'rating', 'total_ratings', 
-                 'is_verified', 'created_at', 'updated_at')
+                 'rating_histogram', 'is_verified', 'created_at', 'updated_at')
         read_only_fields = ('id', 'username', 'rating', 'total_ratings', 
                           'is_verified', 'created_at', 'updated_at')
 
@@ -17,22 +17,24 @@ class UserProfileView(generics.RetrieveAPIView):
     serializer_class = UserProfileSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the auth cache; read the current row
+        return User.objects.get(pk=self.request.user.pk)
 
 class UserProfileUpdateView(generics.UpdateAPIView):
     permission_classes = (permissions.IsAuthenticated, IsOwnerOrReadOnly)
     serializer_class = UserProfileSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may come from the auth cache; read the current row
+        return User.objects.get(pk=self.request.user.pk)
 
 class UserVerificationView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request):
-        user = request.user
+        user = User.objects.get(pk=request.user.pk)
         # Here you would implement your verification logic
         # For example, sending a verification code via SMS or email
         user.is_verified = True
-        user.save()
+        user.save(update_fields=['is_verified', 'updated_at'])
         return Response({'message': 'User verified successfully'}, status=status.HTTP_200_OK) 
\ No newline at end of file
@@ -86,7 +86,7 @@ const Home = () => {
                     <Box sx={{ position: 'relative', width: '100%', pt: '75%', overflow: 'hidden' }}>
                       <CardMedia
                         component="img"
-                        image={product.images && product.images.length > 0 ? product.images[0].image : '/placeholder.png'}
+                        image={product.primary_image || '/placeholder.png'}
                         alt={product.title}
                         sx={{ position: 'absolute', top: 0, left: 0, width: '100%', height: '100%', objectFit: 'contain', p: 1 }}
                       />
@@ -237,7 +237,7 @@ const Home = () => {
               >
                 <Box sx={{ p: 2, display: 'flex', justifyContent: 'center' }}>
                   <img 
-                    src={product.images && product.images.length > 0 ? product.images[0].image : '/placeholder.png'} 
+                    src={product.primary_image || '/placeholder.png'} 
                     alt={product.title}
                     style={{ height: 100, objectFit: 'contain' }}
                   />
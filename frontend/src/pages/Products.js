@@ -10,7 +10,7 @@ const Products = () => {
   const { products, loading, error } = useSelector((state) => state.products);
 
   useEffect(() => {
-    dispatch(fetchProducts());
+    dispatch(fetchProducts({ expand: 'description' }));
   }, [dispatch]);
 
   if (loading) return <CircularProgress sx={{ display: 'block', mx: 'auto', mt: 8 }} />;
@@ -23,11 +23,11 @@ const Products = () => {
           <Grid item xs={12} sm={6} md={4} lg={3} key={product.id}>
             <Card>
               <CardActionArea onClick={() => navigate(`/products/${product.id}`)}>
-                {product.images && product.images.length > 0 && (
+                {product.primary_image && (
                   <CardMedia
                     component="img"
                     height="180"
-                    image={product.images[0].image || '/placeholder.png'}
+                    image={product.primary_image || '/placeholder.png'}
                     alt={product.title}
                   />
                 )}